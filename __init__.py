@@ -1,7 +1,6 @@
 import sys
 
 from sound_toy import (
-    alsa,
     tracks,
     oscillators,
     envelopes,
@@ -10,8 +9,15 @@ from sound_toy import (
     tone,
     mixer,
     sequencer,
-    waveform_plot,
-    instruments)
+    instruments,
+    cache,
+    compiler,
+    parallel,
+    playback,
+    capture,
+    resampler,
+    peaks,
+    profiler)
 
 try:
     from sound_toy import alsa
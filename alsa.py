@@ -1,14 +1,18 @@
 import alsaaudio
-import numpy
-import math
-import errno
 
-from .tracks import NumpyTrack
+from .tracks import DEFAULT_DTYPE, DEFAULT_BLOCKSIZE
+from . import playback
+from . import capture as _capture
 
-def play(track, samplerate=44100, periodsize=32, device='default'):
+def play(track, samplerate=44100, periodsize=32, device='default',
+    blocksize=DEFAULT_BLOCKSIZE, depth=4 * DEFAULT_BLOCKSIZE):
     """
     Play a track through alsa.
     Forces samplerate of the track.
+    The track is rendered in float32 blocks of blocksize samples by
+    a separate thread, up to depth samples ahead of the device
+    (see playback.Player).
+    Returns playback.PlaybackStats.
     """
     pcm = alsaaudio.PCM(
         type=alsaaudio.PCM_PLAYBACK,
@@ -22,25 +26,18 @@ def play(track, samplerate=44100, periodsize=32, device='default'):
         pcm.setformat(alsaaudio.PCM_FORMAT_FLOAT_LE)
         pcm.setperiodsize(periodsize)
 
-        dtype = numpy.dtype('<f4')
-
-        for values in track.as_arrays_iter(samplerate, periodsize):
-            numpy.clip(values, -1, 1, out=values)
-            out = numpy.array(values, dtype);
-
-            pcm.write(out.tostring())
+        player = playback.Player(track, pcm, samplerate, periodsize,
+                                 blocksize, depth)
+        return player.run()
     finally:
         pcm.close();
 
-def record(length, card='hw:0', samplerate=None, periodsize=320,
-    remove_dc_offset = True):
+def _open_capture(card, samplerate, periodsize):
     """
-    Record approximately length seconds of audio.
-    Returns numpy track.
+    Open capture device with 16 bit samples.
+    Returns (pcm, channels, samplerate), samplerate None uses
+    the device default.
     """
-    dtype = numpy.dtype('<i2')
-    maximum = 2**15 - 1
-
     pcm = alsaaudio.PCM(
         type=alsaaudio.PCM_CAPTURE,
         mode=alsaaudio.PCM_NORMAL,
@@ -57,41 +54,36 @@ def record(length, card='hw:0', samplerate=None, periodsize=320,
         if pcm.setformat(alsaaudio.PCM_FORMAT_S16_LE) != \
             alsaaudio.PCM_FORMAT_S16_LE:
             raise Exception("Couldn't set sample format rate")
-        periodsize = pcm.setperiodsize(periodsize)
+        pcm.setperiodsize(periodsize)
+    except:
+        pcm.close()
+        raise
 
-        periods = int(math.ceil(length * samplerate / float(periodsize)))
-        samples = periods * periodsize
+    return pcm, channels, samplerate
 
-        out_arrays = []
-        for i in range(channels):
-            out_arrays.append(numpy.empty(samples))
+def capture(card='hw:0', channel=0, length=None, periodsize=320,
+    filename=None, dtype=DEFAULT_DTYPE):
+    """
+    Return a track streaming live input from the card.
+    See capture.Capture.
+    """
+    def open_pcm(samplerate):
+        pcm, channels, samplerate = _open_capture(card, samplerate, periodsize)
+        return pcm, channels
 
-        for i in range(periods):
-            count, string = pcm.read()
-            if count == -errno.EPIPE:
-                raise Exception("Alsa buffer overrun")
-            period_array = numpy.fromstring(string, dtype)
-            if len(period_array) != periodsize * channels:
-                print("count: ", count,
-                    "len(period_array): ", len(period_array),
-                    "periodsize: ", periodsize,
-                    "channels: ", channels)
+    return _capture.Capture(open_pcm, channel, length, filename, dtype)
 
-            period_array = numpy.array(period_array, numpy.float)
-            period_array /= maximum
+def record(length, card='hw:0', samplerate=None, periodsize=320,
+    remove_dc_offset = True, dtype = DEFAULT_DTYPE, filename = None):
+    """
+    Record length seconds of audio.
+    Returns list of numpy tracks with samples of the given float dtype,
+    one per channel, stored in a memory mapped file if filename is given.
+    """
+    pcm, channels, samplerate = _open_capture(card, samplerate, periodsize)
 
-            for j in range(channels):
-                out_arrays[j][i * periodsize:i * periodsize + count] = \
-                    period_array[j::channels]
+    try:
+        return _capture.record(pcm, channels, samplerate, length,
+                               remove_dc_offset, dtype, filename)
     finally:
         pcm.close()
-
-    if remove_dc_offset:
-        for array in out_arrays:
-            array -= numpy.mean(array)
-
-    ret = []
-    for array in out_arrays:
-        ret.append(NumpyTrack(array, samplerate))
-
-    return ret
@@ -0,0 +1,244 @@
+"""
+Throughput benchmarks of the basic tracks.
+
+Run as `python3 -m sound_toy.benchmark` (from a directory where sound_toy is
+importable), results are printed as JSON, one record per case, so that
+they can be stored and compared between releases.
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy
+
+from . import oscillators, envelopes, mixer, sequencer, rhythm, effects, wav_file
+from .tracks import DEFAULT_BLOCKSIZE, DEFAULT_DTYPE
+
+Result = collections.namedtuple(
+    'Result', ['name', 'samples', 'seconds', 'samples_per_second',
+               'realtime_factor', 'peak_memory'])
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+def _oscillator_cases():
+    """
+    Every oscillator class in every fast path configuration.
+    """
+    configurations = [
+        ('constant', lambda length: dict(
+            freq = 440, amplitude = envelopes.Box(length))),
+        ('freq_modulated', lambda length: dict(
+            freq = oscillators.SineOscillator(5, amplitudeLow = 430, amplitudeHigh = 450),
+            amplitude = envelopes.Box(length))),
+        ('freq_control_rate', lambda length: dict(
+            freq = oscillators.SineOscillator(
+                5, amplitudeLow = 430, amplitudeHigh = 450).control_rate(),
+            amplitude = envelopes.Box(length))),
+        ('phase_modulated', lambda length: dict(
+            freq = 440, phase = oscillators.SineOscillator(3, amplitude = envelopes.Box(length)))),
+        ('amplitude_envelope', lambda length: dict(
+            freq = 440, amplitude = envelopes.ADSR((0.1, 0.1, length - 0.3, 0.1)))),
+        ('amplitude_range', lambda length: dict(
+            freq = envelopes.Box(length, 440), amplitudeLow = 0, amplitudeHigh = 1)),
+    ]
+
+    for cls in _subclasses(oscillators.Oscillator):
+        for configuration, kwargs in configurations:
+            yield ('{}/{}'.format(cls.__name__, configuration),
+                   lambda length, cls = cls, kwargs = kwargs: cls(**kwargs(length)))
+
+
+def _mix(voices, length):
+    return mixer.Mix(*[oscillators.SineOscillator(
+                          100 + i, amplitude = envelopes.Box(length) if i % 2 else
+                          envelopes.ADSR((0.01, 0.05, length - 0.16, 0.1)))
+                       for i in range(voices)])
+
+
+def _ping():
+    return oscillators.SineOscillator(
+        880, amplitude = envelopes.ADSR((0.005, 0.02, 0.05, 0.1)))
+
+
+def _sequencer(length):
+    r = rhythm.Rhythm(4, 960)
+    return sequencer.Sequencer(r, [_ping(), _ping(), _ping()],
+                               ["XXXXXXXXXXXXXXXX", "X X X X X X X X ", "X  X  X  X  X  X"],
+                               repeat = None)
+
+
+def _repeat(length, cache_hit):
+    r = rhythm.Rhythm(4, 480)
+    return rhythm.Repeat(_ping(), r, {0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5},
+                         cache_hit = cache_hit)
+
+
+def _echo(length):
+    # Roughly a tenth of the length is the input, the rest is the tail
+    source = sequencer.Sequencer(rhythm.Rhythm(4, 240), [_ping()], ["XXXX"],
+                                 repeat = max(int(length / 10), 1))
+    return effects.Echo(source, 0.3, 0.02, noisefloor = 0.001)
+
+
+def cases():
+    """
+    Return list of (name, factory) pairs, factory takes length in seconds
+    and returns the track to render.
+    Tracks are built by the factory, so that construction isn't measured.
+    """
+    ret = list(_oscillator_cases())
+    ret.append(('ADSR', lambda length: envelopes.ADSR((0.1, 0.2, length - 0.4, 0.1))))
+    ret.append(('Exponential', lambda length: envelopes.Exponential(1, 0.001, length)))
+    for voices in [1, 8, 64]:
+        ret.append(('Mix/{}'.format(voices), lambda length, voices = voices: _mix(voices, length)))
+    ret.append(('Sequencer/dense', _sequencer))
+    ret.append(('Repeat/cached', lambda length: _repeat(length, True)))
+    ret.append(('Repeat/uncached', lambda length: _repeat(length, False)))
+    ret.append(('Echo/long_tail', _echo))
+    return ret
+
+
+def _measure(name, run, samples, samplerate, repeat):
+    """
+    Call run() repeat times, take the best time and peak memory of the
+    first call.
+    """
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    return Result(name, samples, best, samples / best,
+                  samples / samplerate / best, peak)
+
+
+def measure(name, track, samplerate = 44100, length = 10, blocksize = DEFAULT_BLOCKSIZE,
+            dtype = DEFAULT_DTYPE, repeat = 3):
+    """
+    Measure rendering of at most length seconds of the track.
+    """
+    total = int(length * samplerate)
+    block = numpy.empty(blocksize, dtype)
+
+    def run():
+        renderer = track.renderer(samplerate)
+        rendered = 0
+        while rendered < total:
+            chunk = block[:total - rendered]
+            count = renderer.render(chunk)
+            rendered += count
+            if count < len(chunk):
+                break
+        return rendered
+
+    return _measure(name, run, run(), samplerate, repeat)
+
+
+def _matches(name, pattern):
+    return pattern is None or pattern in name
+
+
+def _wav_file_results(samplerate, length, blocksize, repeat, pattern):
+    track = oscillators.SineOscillator(440, amplitude = envelopes.Box(length))
+    samples = track.len(samplerate)
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for sample_format in ['int16', 'int24', 'int32', 'float32']:
+            filename = os.path.join(directory, sample_format + '.wav')
+            save = lambda: wav_file.save(track, filename, samplerate, blocksize, sample_format)
+            save_name = 'wav_file.save/' + sample_format
+            open_name = 'wav_file.open/' + sample_format
+
+            if _matches(save_name, pattern):
+                results.append(_measure(save_name, save, samples, samplerate, repeat))
+            if _matches(open_name, pattern):
+                if not os.path.exists(filename):
+                    save()
+                results.append(measure(open_name, wav_file.open(filename)[0],
+                                       samplerate, length, blocksize, repeat = repeat))
+
+    return results
+
+
+def run(samplerate = 44100, length = 10, blocksize = DEFAULT_BLOCKSIZE, dtype = DEFAULT_DTYPE,
+        repeat = 3, pattern = None):
+    """
+    Run all benchmarks whose name contains pattern (all if None),
+    return list of Result.
+    """
+    results = []
+    for name, factory in cases():
+        if _matches(name, pattern):
+            results.append(measure(name, factory(length), samplerate, length,
+                                   blocksize, dtype, repeat))
+    results.extend(_wav_file_results(samplerate, length, blocksize, repeat, pattern))
+    return results
+
+
+def report(results, **settings):
+    """
+    Return JSON serializable dict with results and the environment.
+    """
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+        },
+        'settings': settings,
+        'results': [result._asdict() for result in results]
+    }
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument('--samplerate', type = int, default = 44100)
+    parser.add_argument('--length', type = float, default = 10,
+                        help = "Rendered length in seconds.")
+    parser.add_argument('--blocksize', type = int, default = DEFAULT_BLOCKSIZE)
+    parser.add_argument('--dtype', choices = ['float32', 'float64'],
+                        default = numpy.dtype(DEFAULT_DTYPE).name)
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--filter', dest = 'pattern', default = None,
+                        help = "Only run benchmarks whose name contains this.")
+    parser.add_argument('--output', '-o', default = None,
+                        help = "Write the results to a file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    settings = vars(args).copy()
+    del settings['output']
+    results = run(args.samplerate, args.length, args.blocksize, numpy.dtype(args.dtype),
+                  args.repeat, args.pattern)
+
+    if args.output is None:
+        json.dump(report(results, **settings), sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report(results, **settings), f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
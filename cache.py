@@ -0,0 +1,209 @@
+import collections
+import hashlib
+import os
+import threading
+import types
+import numpy
+
+from .tracks import BaseTrack, NumpyTrack, DEFAULT_DTYPE
+
+def structure_key(obj):
+    """
+    Return a hex digest describing the structure of obj.
+    For tracks this covers the class, all parameters and all slave tracks
+    (but not the name), so two separately built but identical track graphs
+    have the same key.
+    Objects can provide _structure() method returning what should be
+    described instead of their attributes.
+    Raises TypeError if the structure contains something that can't
+    be described (iterators, for example).
+    """
+    digest = hashlib.sha1()
+    _describe(obj, digest.update)
+    return digest.hexdigest()
+
+def _describe(obj, write):
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        write(repr((type(obj).__name__, obj)).encode())
+    elif isinstance(obj, (tuple, list)):
+        write(b'(')
+        for item in obj:
+            _describe(item, write)
+            write(b',')
+        write(b')')
+    elif isinstance(obj, (set, frozenset)):
+        write(b'{')
+        for item in sorted(obj, key=repr):
+            _describe(item, write)
+            write(b',')
+        write(b'}')
+    elif isinstance(obj, dict):
+        _describe(('dict', sorted(obj.items(), key=lambda item: repr(item[0]))), write)
+    elif isinstance(obj, numpy.ndarray):
+        write(repr(('ndarray', obj.dtype.str, obj.shape)).encode())
+        write(numpy.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, numpy.generic):
+        _describe(obj.item(), write)
+    elif isinstance(obj, (type, types.FunctionType, types.BuiltinFunctionType)):
+        write(repr(('type', obj.__module__, obj.__qualname__)).encode())
+    elif hasattr(obj, '_structure'):
+        _describe((type(obj), obj._structure()), write)
+    elif hasattr(obj, '__dict__') and not hasattr(obj, '__next__'):
+        attributes = dict(obj.__dict__)
+        if isinstance(obj, BaseTrack):
+            del attributes['name']
+        _describe((type(obj), attributes), write)
+    else:
+        raise TypeError("Can't describe structure of {!r}".format(obj))
+
+
+class RenderCache:
+    """
+    Cache of fully rendered tracks, keyed by the track structure and samplerate.
+    Keeps at most max_bytes of data in memory, least recently used buffers
+    are evicted first. If directory is given, evicted buffers are saved there
+    and loaded back when needed again.
+    Buffers are rendered and kept in the given dtype, float32 halves
+    their size.
+    """
+
+    def __init__(self, max_bytes = 256 * 1024 * 1024, directory = None,
+                 dtype = DEFAULT_DTYPE):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.dtype = numpy.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+
+        self._buffers = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _lookup(self, key):
+        with self._lock:
+            try:
+                data = self._buffers[key]
+            except KeyError:
+                pass
+            else:
+                self._buffers.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            data = numpy.load(self._path(key))
+            data = self._store(key, data)
+            with self._lock:
+                self.hits += 1
+            return data
+
+        return None
+
+    def _store(self, key, data):
+        """
+        Store data under key and return the stored read only array.
+        If an other thread stored the key first, its data is returned.
+        """
+        # Read only view, the array itself may belong to a track
+        data = data.view()
+        data.setflags(write=False)
+        evicted = []
+
+        with self._lock:
+            if key in self._buffers:
+                return self._buffers[key]
+            self._buffers[key] = data
+            self._bytes += data.nbytes
+
+            while self._bytes > self.max_bytes and len(self._buffers) > 1:
+                old_key, old_data = self._buffers.popitem(last=False)
+                self._bytes -= old_data.nbytes
+                evicted.append((old_key, old_data))
+
+        if self.directory is not None:
+            for old_key, old_data in evicted:
+                if not os.path.exists(self._path(old_key)):
+                    numpy.save(self._path(old_key), old_data)
+
+        return data
+
+    def get(self, track, samplerate, key = None):
+        """
+        Return read only numpy array with the whole rendered track.
+        The track must be finite.
+
+        Parameters:
+            key: Structure key of the track, if it is already known.
+        """
+        if key is None:
+            key = structure_key(track)
+        key = structure_key((key, samplerate, self.dtype.str))
+
+        data = self._lookup(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            self.misses += 1
+
+        return self._store(key, track.as_array(samplerate, dtype = self.dtype))
+
+    def clear(self):
+        """
+        Drop all buffers from memory (files in directory are kept).
+        """
+        with self._lock:
+            self._buffers.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._buffers)
+
+    @property
+    def bytes(self):
+        """ Size of the data kept in memory. """
+        return self._bytes
+
+
+default_cache = RenderCache()
+
+
+class Cached(BaseTrack):
+    """
+    Track that renders the slave only once and then replays the rendered
+    buffer from a render cache.
+    Tracks with the same structure share the cached data.
+    Infinite tracks and tracks whose structure can't be described
+    are rendered normally.
+    """
+
+    def __init__(self, track, cache = None):
+        super(Cached, self).__init__(track)
+        self._cache = cache
+
+        try:
+            self._key = structure_key(track)
+        except TypeError:
+            self._key = None
+
+    def _structure(self):
+        return self._slaves[0]
+
+    def _renderer(self, samplerate):
+        track = self._slaves[0]
+
+        if self._key is None or not track.len(samplerate) < float('inf'):
+            return track.renderer(samplerate)
+
+        cache = default_cache if self._cache is None else self._cache
+        data = cache.get(track, samplerate, self._key)
+        return NumpyTrack(data, samplerate).renderer(samplerate)
+
+    def len(self, samplerate):
+        return self._slaves[0].len(samplerate)
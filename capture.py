@@ -0,0 +1,143 @@
+import errno
+import math
+import numpy
+
+from .tracks import BaseTrack, Renderer, NumpyTrack, DEFAULT_DTYPE
+
+_pcm_dtype = numpy.dtype('<i2')
+_maximum = 2**15 - 1
+
+def _read_period(pcm, channels):
+    """
+    Read one period from the device.
+    Returns (frames, channels) view of the raw interleaved samples.
+    """
+    count, data = pcm.read()
+    if count == -errno.EPIPE:
+        raise Exception("Alsa buffer overrun")
+    elif count < 0:
+        raise Exception("Alsa read failed ({})".format(count))
+
+    return numpy.frombuffer(data, _pcm_dtype)[:count * channels].reshape(count, channels)
+
+def _open_memmap(filename, dtype, shape):
+    return numpy.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+
+
+class _CaptureRenderer(Renderer):
+    def __init__(self, capture, samplerate):
+        super(_CaptureRenderer, self).__init__(samplerate)
+        self._pcm, self._channels = capture._open_pcm(samplerate)
+        self._channel = capture._channel
+        self._remaining = capture.len(samplerate)
+        self._pending = numpy.empty(0, _pcm_dtype)
+
+        if capture._filename is None:
+            self._file = None
+        else:
+            self._file = _open_memmap(capture._filename, capture._dtype,
+                                      (self._remaining,))
+        self._position = 0
+
+    def render(self, out):
+        written = 0
+        while written < len(out) and self._remaining > 0:
+            if not len(self._pending):
+                # Strided view of the channel, no copy
+                self._pending = _read_period(self._pcm, self._channels)[:, self._channel]
+
+            count = int(min(len(out) - written, len(self._pending), self._remaining))
+            chunk = out[written:written + count]
+            numpy.multiply(self._pending[:count], 1 / _maximum, out=chunk)
+
+            self._pending = self._pending[count:]
+            self._remaining -= count
+            written += count
+
+        if self._file is not None:
+            self._file[self._position:self._position + written] = out[:written]
+        self._position += written
+
+        if self._remaining <= 0:
+            self.close()
+
+        return written
+
+    def close(self):
+        """
+        Close the device (and flush the file), the renderer ends.
+        """
+        self._remaining = 0
+        if self._pcm is not None:
+            self._pcm.close()
+            self._pcm = None
+        if self._file is not None:
+            self._file.flush()
+
+
+class Capture(BaseTrack):
+    """
+    Live input from a capture device.
+    Every renderer opens the device and streams blocks as they arrive.
+    Samples of the selected channel are converted straight from the
+    device buffer without de-interleaving copies.
+    If filename is given, the captured samples are also written to
+    a memory mapped .npy file (this needs a finite length).
+    """
+
+    def __init__(self, open_pcm, channel = 0, length = None, filename = None,
+                 dtype = DEFAULT_DTYPE):
+        """
+        Parameters:
+            open_pcm: Function taking samplerate and returning pair
+                (pcm, channels) with a capture device configured for 16 bit
+                little endian samples. The device must have method read()
+                returning (frame count, bytes) and close().
+            channel: Index of the captured channel.
+            length: Length of the track in seconds, None for infinite.
+        """
+        super(Capture, self).__init__()
+        if filename is not None and length is None:
+            raise Exception("Capturing to a file needs a finite length.")
+
+        self._open_pcm = open_pcm
+        self._channel = channel
+        self._length = length
+        self._filename = filename
+        self._dtype = dtype
+
+    def _renderer(self, samplerate):
+        return _CaptureRenderer(self, samplerate)
+
+    def len(self, samplerate):
+        if self._length is None:
+            return float('inf')
+        return int(math.ceil(self._length * samplerate))
+
+
+def record(pcm, channels, samplerate, length, remove_dc_offset = True,
+           dtype = DEFAULT_DTYPE, filename = None):
+    """
+    Record length seconds from an opened capture device (see Capture).
+    Returns list of numpy tracks, one per channel.
+    If filename is given, the samples are stored in a memory mapped
+    .npy file instead of memory.
+    """
+    samples = int(math.ceil(length * samplerate))
+    shape = (channels, samples)
+    if filename is None:
+        out = numpy.empty(shape, dtype)
+    else:
+        out = _open_memmap(filename, dtype, shape)
+
+    position = 0
+    while position < samples:
+        frames = _read_period(pcm, channels)[:samples - position]
+        # De-interleaves and converts in one pass
+        numpy.multiply(frames.T, 1 / _maximum, out=out[:, position:position + len(frames)])
+        position += len(frames)
+
+    if remove_dc_offset:
+        out -= numpy.mean(out, axis=1, keepdims=True)
+
+    return [NumpyTrack(array, samplerate) for array in out]
@@ -0,0 +1,229 @@
+import copy
+import numpy
+
+from .tracks import BaseTrack, Renderer, DEFAULT_BLOCKSIZE, DEFAULT_DTYPE
+from .envelopes import Interpolate, Exponential, Box
+
+def fold(track):
+    """
+    Return track equivalent to the given one, with constant envelopes
+    replaced by Box (which oscillators treat as plain numbers).
+    Works through the dataflow part of the graph, the original graph
+    is not modified.
+    """
+    if isinstance(track, Box):
+        return track
+    elif isinstance(track, Interpolate):
+        values = {y for x, y in track._points}
+        if len(values) == 1:
+            return Box(track._length, values.pop())
+        return track
+    elif isinstance(track, Exponential):
+        if track._start_val == track._stop_val:
+            return Box(track._length, track._start_val)
+        return track
+    elif not track._dataflow:
+        return track
+
+    folded = {id(slave): fold(slave) for slave in track._slaves}
+    if all(folded[id(slave)] is slave for slave in track._slaves):
+        return track
+
+    ret = copy.copy(track)
+    for name, value in vars(track).items():
+        if isinstance(value, BaseTrack):
+            setattr(ret, name, folded[id(value)])
+    ret._slaves = tuple(folded[id(slave)] for slave in track._slaves)
+    return ret
+
+
+class _BufferInput(Renderer):
+    """
+    Input of a dataflow renderer that serves the block already
+    rendered by the plan into a pool buffer.
+    """
+    def __init__(self, samplerate):
+        super(_BufferInput, self).__init__(samplerate)
+        self.buffer = None
+        self.count = 0
+
+    def render(self, out):
+        count = min(len(out), self.count)
+        out[:count] = self.buffer[:count]
+        return count
+
+    def render_block(self, size, dtype = None):
+        # Blocks are served without copying when the dtype matches
+        if size >= self.count == len(self.buffer):
+            block = self.buffer
+        else:
+            block = self.buffer[:min(size, self.count)]
+        if dtype is not None:
+            block = block.astype(dtype, copy = False)
+        return block
+
+
+class _Step:
+    def __init__(self, renderer, name, inputs, dtype = None):
+        self.renderer = renderer
+        self.name = name
+        self.inputs = inputs # Steps whose output this step reads
+        self.dtype = dtype # Dtype of the output buffer
+        self.output = None # _BufferInput, None for the final step
+        self.buffer = None # Index of the pool buffer
+
+    def finish(self):
+        """
+        Mark the step and all its inputs as no longer needed.
+        """
+        self.renderer = None
+        for step in self.inputs:
+            if step.renderer is not None:
+                step.finish()
+
+
+class Plan(Renderer):
+    """
+    Flat execution plan of a track graph.
+    Dataflow tracks (oscillators, echo, ...) are split into steps ordered
+    so that every step runs after all of its inputs. All steps render
+    each block into buffers from a pool that is allocated once; a buffer
+    is reused as soon as its last reader has run.
+    Other tracks are single steps that render their subgraphs themselves.
+    The pool has the given dtype, except for inputs that are read in
+    an other dtype (oscillator frequency and phase are always float64).
+    """
+
+    def __init__(self, track, samplerate, blocksize = DEFAULT_BLOCKSIZE,
+                 dtype = DEFAULT_DTYPE):
+        super(Plan, self).__init__(samplerate)
+        self.blocksize = blocksize
+        self.dtype = dtype
+
+        self._steps = []
+        renderer, inputs = self._compile(fold(track))
+        self._steps.append(_Step(renderer, track.name, inputs))
+
+        self._allocate()
+
+    def _compile(self, track):
+        """
+        Return renderer for the track and list of its input steps.
+        Input steps are appended to the plan before the track itself.
+        """
+        if not track._dataflow:
+            return track.renderer(self.samplerate), []
+
+        inputs = []
+        def open_input(input_track, dtype = None):
+            renderer, input_inputs = self._compile(input_track)
+            step = _Step(renderer, input_track.name, input_inputs,
+                         numpy.dtype(self.dtype if dtype is None else dtype))
+            step.output = _BufferInput(self.samplerate)
+            self._steps.append(step)
+            inputs.append(step)
+            return step.output
+
+        return track._renderer(self.samplerate, open_input), inputs
+
+    def _allocate(self):
+        """
+        Assign pool buffers to step outputs. Output of a step must not
+        share buffer with its inputs, inputs are released after the step.
+        """
+        free = {} # dtype -> list of free buffer indices
+        counts = {} # dtype -> number of buffers
+        for step in self._steps[:-1]:
+            dtype_free = free.setdefault(step.dtype, [])
+            if dtype_free:
+                step.buffer = dtype_free.pop()
+            else:
+                step.buffer = counts.get(step.dtype, 0)
+                counts[step.dtype] = step.buffer + 1
+
+            for input_step in step.inputs:
+                free[input_step.dtype].append(input_step.buffer)
+
+        self._pools = {dtype: numpy.empty((count, self.blocksize), dtype)
+                       for dtype, count in counts.items()}
+        for step in self._steps[:-1]:
+            step.output.buffer = self._pools[step.dtype][step.buffer]
+
+    @property
+    def buffer_count(self):
+        return sum(len(pool) for pool in self._pools.values())
+
+    def describe(self):
+        """
+        Return list of strings describing the steps.
+        """
+        ret = []
+        for i, step in enumerate(self._steps):
+            inputs = ", ".join(str(self._steps.index(x)) for x in step.inputs)
+            if step.output is None:
+                output = "out"
+            elif step.dtype == self.dtype:
+                output = "buffer {}".format(step.buffer)
+            else:
+                output = "{} buffer {}".format(step.dtype, step.buffer)
+            ret.append("{}: {} ({}) -> {}".format(i, step.name, inputs, output))
+        return ret
+
+    def render(self, out):
+        steps = self._steps[:-1]
+        final = self._steps[-1].renderer
+        written = 0
+
+        while written < len(out):
+            size = min(self.blocksize, len(out) - written)
+
+            for step in steps:
+                output = step.output
+                renderer = step.renderer
+                if renderer is None:
+                    output.count = 0
+                    continue
+
+                if size == self.blocksize:
+                    count = renderer.render(output.buffer)
+                else:
+                    count = renderer.render(output.buffer[:size])
+                if count < size:
+                    # The track has ended, so have all its inputs.
+                    step.finish()
+                output.count = count
+
+            count = final.render(out[written:written + size])
+            written += count
+            if count < size:
+                break
+
+        return written
+
+
+def compile_track(track, samplerate, blocksize = DEFAULT_BLOCKSIZE,
+                  dtype = DEFAULT_DTYPE):
+    """
+    Return Plan rendering the track.
+    """
+    return Plan(track, samplerate, blocksize, dtype)
+
+
+class Compiled(BaseTrack):
+    """
+    Track that renders its slave through a compiled plan,
+    with intermediate buffers of the given dtype.
+    """
+    def __init__(self, track, blocksize = DEFAULT_BLOCKSIZE, dtype = DEFAULT_DTYPE):
+        super(Compiled, self).__init__(track)
+        self._blocksize = blocksize
+        self._dtype = dtype
+
+    def _structure(self):
+        return self._slaves[0]
+
+    def _renderer(self, samplerate):
+        return Plan(self._slaves[0], samplerate, self._blocksize, self._dtype)
+
+    def len(self, samplerate):
+        return self._slaves[0].len(samplerate)
@@ -1,47 +1,114 @@
 from . import tracks
 import math
-import collections
-import itertools
+import numpy
 
 class Echo(tracks.BaseTrack):
+    """
+    Feedback delay line: every echo is delayed by time and attenuated
+    by attenuation relative to the previous one.
+    """
     def __init__(self, input, time, attenuation, noisefloor = 0.01):
         super().__init__(input)
         self._time = time
         self._persistence = 1 - attenuation
         self._noisefloor = noisefloor
 
-    def _buffer_length(self, samplerate):
-        # Buffer size is selected like this:
-        # buffer_length = repeat * time * samplerate
-        # attenuation ** repeat <= noisefloor
+    def _tail_length(self, samplerate):
+        # Tail length is selected like this:
+        # tail_length = repeat * time * samplerate
+        # persistence ** repeat <= noisefloor
         repeat = math.ceil(math.log(self._noisefloor, self._persistence))
-        buffer_length = repeat * self._time * samplerate
-        return repeat, buffer_length
+        return int(math.ceil(repeat * self._time * samplerate))
 
-    def as_iter(self, samplerate):
-        repeat, buffer_length = self._buffer_length(samplerate)
+    _dataflow = True
 
-        buffer = collections.deque([0] * buffer_length, buffer_length)
+    def _renderer(self, samplerate, open_input = None):
+        return _EchoRenderer(self, samplerate, open_input)
 
-        for value in self._slaves[0].as_iter(samplerate):
-            out = 0
-            for index in range(0, buffer_length, self._time * samplerate):
-                out += buffer[index]
-                out = out * self._persistence
-            out += value
+    def len(self, samplerate):
+        return self._slaves[0].len(samplerate) + self._tail_length(samplerate)
 
-            buffer.append(out)
-            yield out
 
-        for i in range(buffer_length):
-            out = 0
-            for index in range(0, buffer_length, self._time * samplerate):
-                out += buffer[index]
-                out = out * self._persistence
+class _EchoRenderer(tracks.Renderer):
+    """
+    y[n] = x[n] + persistence * y[n - delay]
+    Past output is kept in a circular buffer, blocks are processed in chunks
+    no longer than the delay, so that each chunk depends only on the buffer.
+    Fractional delays are linearly interpolated.
+    Skipping jumps over the input and only runs the delay line over
+    a warm-up window as long as the tail, so the result after a skip
+    matches the full render only up to the noise floor.
+    """
+    def __init__(self, echo, samplerate, open_input = None):
+        super(_EchoRenderer, self).__init__(samplerate, open_input)
 
-            buffer.append(out)
-            yield out
+        delay = echo._time * samplerate
+        self._delay = int(delay)
+        self._fraction = delay - self._delay
+        if self._delay < 1:
+            raise Exception("Echo time must be at least one sample long.")
 
-    def len(self, samplerate):
-        repeat, buffer_length = self._buffer_length(samplerate)
-        return self._slaves[0].len(samplerate) + buffer_length
+        self._input = self._open(echo._slaves[0])
+        self._persistence = echo._persistence
+        self._tail = echo._tail_length(samplerate)
+
+        self._buffer = numpy.zeros(self._delay + 2)
+        self._write = 0
+
+        # Echoes of input older than this are below the noise floor
+        self._warmup = self._tail
+
+    def _feedback(self, chunk):
+        """
+        Add echoes to the chunk in place and store it to the buffer.
+        """
+        size = len(self._buffer)
+        positions = numpy.arange(self._write, self._write + len(chunk))
+
+        delayed = self._buffer[(positions - self._delay) % size]
+        if self._fraction:
+            delayed *= 1 - self._fraction
+            delayed += self._fraction * self._buffer[(positions - self._delay - 1) % size]
+
+        delayed *= self._persistence
+        chunk += delayed
+
+        self._buffer[positions % size] = chunk
+        self._write = (self._write + len(chunk)) % size
+
+    def render(self, out):
+        count = 0
+        if self._input is not None:
+            count = self._input.render(out)
+            if count < len(out):
+                self._input = None
+
+        tail = 0
+        if self._input is None:
+            tail = min(len(out) - count, self._tail)
+            out[count:count + tail] = 0
+            self._tail -= tail
+
+        total = count + tail
+        for start in range(0, total, self._delay):
+            self._feedback(out[start:min(start + self._delay, total)])
+
+        return total
+
+    def skip(self, count):
+        fast = count - self._warmup
+        skipped = 0
+
+        if fast > 0 and self._input is not None:
+            skipped = self._input.skip(fast)
+            if skipped < fast:
+                # The input ended long enough ago for the echoes to fade out
+                self._input = None
+                tail = min(fast - skipped, self._tail)
+                self._tail -= tail
+                skipped += tail
+                self._buffer[:] = 0
+                if skipped < fast:
+                    return skipped
+
+        return skipped + super(_EchoRenderer, self).skip(count - skipped)
@@ -1,16 +1,35 @@
 import itertools
 import math
 import operator
+import numpy
 
-from . import util
 from . import tracks
 
-def _exp_iterator(n0, l, count):
+class _EnvelopeRenderer(tracks.Renderer):
     """
-    Iterate over exponential function n0 * e**(l * x) where x goes from 0 to count.
-    If count is None, iterates to infinity.
+    Renders an envelope using its _fill method, that can compute values
+    for any range of samples directly.
     """
-    return (n0 * math.exp(x * l) for x in util.counted_iterator())
+
+    def __init__(self, envelope, params, samplerate):
+        """ params are envelope specific precomputed values for the samplerate. """
+        super(_EnvelopeRenderer, self).__init__(samplerate)
+        self._fill = envelope._fill
+        self._params = params
+        self._length = envelope.len(samplerate)
+        self._position = 0
+
+    def render(self, out):
+        count = max(min(len(out), self._length - self._position), 0)
+        self._fill(self._params, self._position, out[:count])
+        self._position += count
+        return count
+
+    def skip(self, count):
+        count = max(min(count, self._length - self._position), 0)
+        self._position += count
+        return count
+
 
 class Interpolate(tracks.BaseTrack):
     """ An envelope that go through the given points using
@@ -39,6 +58,8 @@ class Interpolate(tracks.BaseTrack):
         if points[-1][0] < length:
             points = points + [(length, points[-1][1])]
 
+        # Keep only the points inside the envelope, plus one
+        # on each side for interpolating the edges
         i0 = None
         i1 = None
         for i, (x, y) in enumerate(points):
@@ -49,35 +70,40 @@ class Interpolate(tracks.BaseTrack):
                 else:
                     i0 = i - 1
             if x > length:
-                if i == len(poins) - 1:
-                    assert x == length
-                    i1 = len(points)
-                else:
-                    i1 = i + 1
+                i1 = i + 1
                 break
 
         self._points = points[i0:i1]
         self._length = length
 
-    def as_iter(self, samplerate):
+    def _renderer(self, samplerate):
         points = [
             (round(t * samplerate), v)
             for (t, v) in self._points]
+        xs = numpy.array([x for x, y in points])
 
-        return itertools.chain.from_iterable(
-            self._interp_iterator(
-                range(points[i][0], points[i + 1][0]),
-                points, i)
-            for i in range(len(points) - 1))
+        return _EnvelopeRenderer(self, (points, xs), samplerate)
 
     def len(self, samplerate):
         return int(self._length * samplerate)
 
+    def _fill(self, params, start, out):
+        """ Write values of samples start, start + 1, ... into out.
+        Finds the segments covering the range and fills each using _interp_block."""
+        points, xs = params
+        x = numpy.arange(start, start + len(out))
+        bounds = numpy.searchsorted(x, xs)
+
+        for i in range(len(points) - 1):
+            a, b = bounds[i], bounds[i + 1]
+            if b > a:
+                out[a:b] = self._interp_block(x[a:b], points, i)
+
     @staticmethod
-    def _interp_iterator(x_iter, points, i):
-        """ Yield values for every x in x_iter.
+    def _interp_block(x, points, i):
+        """ Return array of values for every x in array x.
 
-        x_iter -- iterator of x values.
+        x -- numpy array of x values.
         points -- sorted list of (x, y) tuples.
         i -- specifies the pair of points to interpolate between (from i to (i + 1))."""
         raise NotImplementedError()
@@ -86,19 +112,24 @@ class Interpolate(tracks.BaseTrack):
 class PiecewiseLinear(Interpolate):
     """ Interpolate the points using line segments """
     @staticmethod
-    def _interp_iterator(x_iter, points, i):
+    def _interp_block(x, points, i):
         x0, y0 = points[i]
         x1, y1 = points[i + 1]
 
         count = x1 - x0
 
         if count == 0:
-            return []
+            return numpy.empty(0)
 
         a = (y1 - y0) / count
         b = y0 - a * x0
 
-        return (a * x + b for x in x_iter)
+        return a * x + b
+
+    def _fill(self, params, start, out):
+        points, xs = params
+        ys = [y for x, y in points]
+        out[:] = numpy.interp(numpy.arange(start, start + len(out)), xs, ys)
 
 
 class ADSR(PiecewiseLinear):
@@ -121,13 +152,20 @@ class Exponential(tracks.BaseTrack):
         self._start_val = start_val
         self._stop_val = stop_val
 
-    def as_iter(self, samplerate):
+    def _renderer(self, samplerate):
         length = self.len(samplerate)
 
         n0 = self._start_val
         l = math.log(self._stop_val / n0) / length
 
-        return _exp_iterator(n0, l, length)
+        return _EnvelopeRenderer(self, (n0, l), samplerate)
+
+    def _fill(self, params, start, out):
+        """ n0 * e**(l * x) """
+        n0, l = params
+        numpy.multiply(numpy.arange(start, start + len(out)), l, out=out)
+        numpy.exp(out, out=out)
+        out *= n0
 
     def len(self, samplerate):
         return int(self._length * samplerate)
@@ -142,5 +180,8 @@ class Box(PiecewiseLinear):
 
         super(Box, self).__init__(points = [(0, value)], length = length)
 
-    def as_iter(self, samplerate):
-        return itertools.repeat(self._value, self.len(samplerate))
+    def _renderer(self, samplerate):
+        return _EnvelopeRenderer(self, self._value, samplerate)
+
+    def _fill(self, value, start, out):
+        out[:] = value
@@ -15,4 +15,4 @@ ping2 = sound_toy.oscillators.SquareOscillator(
 repeated1 = sound_toy.rhythm.Repeat(ping1, r, {0, 0.75, 1})
 repeated2 = sound_toy.rhythm.Repeat(ping2, r, {0})
 
-sound_toy.alsa.play(sound_toy.tracks.Mixer(repeated1, repeated2))
+sound_toy.alsa.play(sound_toy.mixer.Mix(repeated1, repeated2))
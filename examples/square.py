@@ -4,7 +4,7 @@ import sound_toy
 
 s = sound_toy.oscillators.SineOscillator(
     freq = sound_toy.tone.Tone('D'),
-    phase = sound_toy.oscillators.SineOscillator(amplitude = 4, freq = 7),
+    phase = sound_toy.oscillators.SineOscillator(amplitude = 4, freq = 7).control_rate(),
     amplitude = sound_toy.envelopes.Box(10))
 
 #sound_toy.waveform_plot.plot([s], samplerate=100)
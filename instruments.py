@@ -1,8 +1,16 @@
 from . import util
 from . import oscillators
 from . import envelopes
+from . import cache as render_cache
 
-@util.Memoize
-def sine(freq, amplitude, length):
+@util.memoize(maxsize = 1024)
+def sine(freq, amplitude, length, cache = None):
+    """
+    If cache (a cache.RenderCache) is given, the note is rendered only
+    once and replayed from the cache.
+    """
     adsr = envelopes.ADSR((0.1, 0.1, length, 0.5), 0.5 * amplitude, amplitude)
-    return oscillators.SineOscillator(freq, amplitude = adsr)
+    track = oscillators.SineOscillator(freq, amplitude = adsr)
+    if cache is not None:
+        track = render_cache.Cached(track, cache)
+    return track
@@ -1,5 +1,5 @@
 from . import tracks
-import collections
+import numpy
 
 
 class Mixer:
@@ -8,33 +8,142 @@ class Mixer:
     Keeps a list of playing tracks and mixes them all together.
     Tracks can be added during playing (but not removed), each
     runs until it returns.
-    Behaves as an infinite iterator.
+    Mixes whole blocks at once, each track can start at any sample
+    of the block. Can also behave as an infinite iterator.
     """
 
     def __init__(self, samplerate):
         self._samplerate = samplerate
-        self._playing = []
+        self._playing = [] # [renderer, offset] pairs, None for finished tracks
+        self._finished = 0
+        self._scratch = numpy.empty(0)
 
-    def add_track(self, track):
-        self._playing.append(track.as_iter(self._samplerate))
+    def add_track(self, track, offset = 0):
+        """
+        Start playing a track.
+
+        Parameters:
+            track: The track to add.
+            offset: Number of samples from the start of the next rendered
+                block to the first sample of the track.
+        """
+        self.add_renderer(track.renderer(self._samplerate), offset)
+
+    def add_renderer(self, renderer, offset = 0):
+        """
+        Same as add_track, but with already created renderer.
+        """
+        self._playing.append([renderer, offset])
 
     def is_empty(self):
-        return not len(self._playing)
+        return len(self._playing) == self._finished
+
+    def _retire(self):
+        """
+        Remove finished tracks from the list of playing.
+        Called only once enough of them accumulates.
+        """
+        self._playing = [voice for voice in self._playing if voice is not None]
+        self._finished = 0
+
+    def render(self, out):
+        """
+        Overwrite out with the next len(out) samples of the mix.
+        Returns number of samples that contain output of some track
+        (tracks that are playing at the end of the block count as the
+        whole block).
+        """
+        size = len(out)
+        if len(self._scratch) < size or self._scratch.dtype != out.dtype:
+            self._scratch = numpy.empty(size, out.dtype)
+        scratch = self._scratch
+
+        out[:] = 0
+        used = 0
+
+        for i, voice in enumerate(self._playing):
+            if voice is None:
+                continue
+
+            renderer, offset = voice
+            if offset >= size:
+                voice[1] = offset - size
+                used = size
+                continue
+
+            count = renderer.render(scratch[:size - offset])
+            out[offset:offset + count] += scratch[:count]
+            voice[1] = 0
+
+            if offset + count < size:
+                self._playing[i] = None
+                self._finished += 1
+                used = max(used, offset + count)
+            else:
+                used = size
+
+        if self._finished > len(self._playing) // 2:
+            self._retire()
+
+        return used
+
+    def skip(self, count):
+        """
+        Advance all playing tracks by count samples.
+        """
+        for i, voice in enumerate(self._playing):
+            if voice is None:
+                continue
+
+            renderer, offset = voice
+            if offset >= count:
+                voice[1] = offset - count
+                continue
+
+            skipped = renderer.skip(count - offset)
+            voice[1] = 0
+
+            if offset + skipped < count:
+                self._playing[i] = None
+                self._finished += 1
+
+        if self._finished > len(self._playing) // 2:
+            self._retire()
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        new_playing = []
-        value = 0
+        value = numpy.empty(1)
+        self.render(value)
+        return value[0]
 
-        for playing in self._playing:
-            try:
-                value += next(playing)
-            except StopIteration:
-                continue
-            else:
-                new_playing.append(playing)
 
-        self._playing = new_playing
-        return value
+class _MixRenderer(tracks.Renderer):
+    def __init__(self, slaves, samplerate):
+        super(_MixRenderer, self).__init__(samplerate)
+        self._mixer = Mixer(samplerate)
+        for track in slaves:
+            self._mixer.add_track(track)
+
+    def render(self, out):
+        return self._mixer.render(out)
+
+    def skip(self, count):
+        self._mixer.skip(count)
+        return count
+
+
+class Mix(tracks.BaseTrack):
+    """
+    Track that plays all its slaves at once.
+    """
+
+    def _renderer(self, samplerate):
+        return _MixRenderer(self._slaves, samplerate)
+
+    def _parts(self, samplerate, length):
+        return [(0, track) for track in self._slaves], 0
+
+    def len(self, samplerate):
+        return max(track.len(samplerate) for track in self._slaves)
@@ -1,11 +1,7 @@
-from .tracks import BaseTrack
+from .tracks import BaseTrack, Renderer, DEFAULT_BLOCKSIZE
 from .envelopes import Box
-import itertools
 import math
-import collections
-
-if hasattr(itertools, 'izip'):
-    zip = itertools.izip
+import numpy
 
 class Oscillator(BaseTrack):
     """
@@ -37,15 +33,15 @@ class Oscillator(BaseTrack):
             self._amplitudeLow = None
             self.add_slave(amplitude)
         elif amplitudeLow is not None and amplitudeHigh is not None:
+            if amplitude != 1:
+               raise Exception("If amplitudeLow and amplitudeHigh are set,"
+                               "amplitude must not be set.")
+
             self._amplitude = None
             self._amplitudeHigh = amplitudeHigh
             self._amplitudeLow = amplitudeLow
             self.add_slave(amplitudeLow)
             self.add_slave(amplitudeHigh)
-
-            if self._amplitude != 1:
-               raise Exception("If amplitudeLow and amplitudeHigh are set,"
-                               "amplitude must not be set.")
         else:
             raise Exception("Both amplitudeLow and amplitudeHigh" +
                             "must be either None or not None")
@@ -53,6 +49,7 @@ class Oscillator(BaseTrack):
     def _func(self, x):
         """
         The actual function that generates the sound.
+        Works in place on a numpy array of arguments.
         Should be periodic from 0 to self._period, return values from -1 to 1.
         Must be overriden in subclasses.
         """
@@ -66,106 +63,10 @@ class Oscillator(BaseTrack):
         """
         raise NotImplemented()
 
-    def _convert(self, x, samplerate):
-        if x is None:
-            return None
-        elif isinstance(x, Box):
-            if self._limit is None:
-                self._limit = x.len(samplerate)
-            else:
-                self._limit = min(self._limit, x.len(samplerate))
-            return float(x._value)
-        elif isinstance(x, BaseTrack):
-            return x.as_iter(samplerate)
-        else:
-            return float(x)
-
-    @staticmethod
-    def _cumsum(it, add, multiplier):
-        """
-        Calculate cumulative sum of it, modifying each result
-        using linear function.
-        """
-        accumulator = add
-        for x in it:
-            yield multiplier * accumulator
-            accumulator += x
-
-    @staticmethod
-    def _cumsum2(it, add_it, multiplier):
-        """
-        Calculate cumulative sum of it, modifying each result
-        using linear function.
-        Add is an iterator.
-        """
-        accumulator = 0
-        for x, add in zip(it, add_it):
-            yield multiplier * accumulator + add
-            accumulator += x
+    _dataflow = True
 
-    @staticmethod
-    def _count_and_add(add, step):
-        """
-        Iterate over i * step + add
-        where i goes 1, 2, 3 ...
-        and add is an iterator.
-        """
-        accumulator = 0
-        for x in add:
-            yield accumulator + x
-            accumulator += step
-
-    @staticmethod
-    def _is_constant(x):
-        return not isinstance(x, collections.Iterator)
-
-    def as_iter(self, samplerate):
-        self._limit = None
-
-        freq = self._convert(self._freq, samplerate)
-        phase = self._convert(self._phase, samplerate)
-        amplitude = self._convert(self._amplitude, samplerate)
-        amplitudeHigh = self._convert(self._amplitudeHigh, samplerate)
-        amplitudeLow = self._convert(self._amplitudeLow, samplerate)
-
-        freq_multiplier = self._period / float(samplerate)
-
-        if self._is_constant(freq):
-            if self._is_constant(phase):
-                x_iterator = itertools.count(phase, freq * freq_multiplier)
-            else:
-                x_iterator = self._count_and_add(phase, freq * freq_multiplier)
-        else:
-            if self._is_constant(phase):
-                x_iterator = self._cumsum(freq, phase, freq_multiplier)
-            else:
-                x_iterator = self._cumsum2(freq, phase, freq_multiplier)
-
-        if amplitude == 1:
-            ret = (self._func(x) for x in x_iterator)
-        elif amplitude is not None:
-            if self._is_constant(amplitude):
-                ret = (amplitude * self._func(x) for x in x_iterator)
-            else:
-                ret = (a * self._func(x) for x, a in zip(x_iterator, amplitude))
-        else:
-            assert amplitude is None
-
-            # this option is a little too complicated, so I'll just collapse it
-            # to the most general case.
-            if self._is_constant(amplitudeHigh):
-                amplitudeHigh = itertools.repeat(amplitudeHigh)
-            if self._is_constant(amplitudeLow):
-                amplitudeLow = itertools.repeat(amplitudeLow)
-
-            ret = (((ah + al) + (ah - al) *
-                self._func(x)) * 0.5 for
-                x, ah, al in zip(x_iterator, amplitudeHigh, amplitudeLow))
-
-        if self._limit is None:
-            return ret
-        else:
-            return itertools.islice(ret, self._limit)
+    def _renderer(self, samplerate, open_input = None):
+        return _OscillatorRenderer(self, samplerate, open_input)
 
     def len(self, samplerate):
         if not len(self._slaves):
@@ -192,27 +93,316 @@ class Oscillator(BaseTrack):
     def __repr__(self):
         return self._str_repr(repr)
 
+class _OscillatorRenderer(Renderer):
+    """
+    Renders an oscillator.
+    Constant parameters are kept as floats, all others are
+    renderers of the parameter tracks.
+    With modulated frequency the phase is accumulated in blocks and
+    the running sum of frequencies is kept between blocks.
+    """
+
+    def __init__(self, oscillator, samplerate, open_input = None):
+        super(_OscillatorRenderer, self).__init__(samplerate, open_input)
+
+        self._limit = None
+        self._position = 0
+
+        self._func = oscillator._func
+        self._period = oscillator._period
+        self._freq = self._convert(oscillator._freq, numpy.float64)
+        self._phase = self._convert(oscillator._phase, numpy.float64)
+        self._amplitude = self._convert(oscillator._amplitude)
+        self._amplitudeHigh = self._convert(oscillator._amplitudeHigh)
+        self._amplitudeLow = self._convert(oscillator._amplitudeLow)
+
+        self._params = (self._freq, self._phase, self._amplitude,
+                        self._amplitudeHigh, self._amplitudeLow)
+        self._modulated = any(isinstance(x, Renderer) for x in self._params)
+
+        self._freq_multiplier = oscillator._period / float(samplerate)
+        self._accumulator = 0
+        self._ramp = numpy.arange(0)
+        self._phases = numpy.empty(0)
+
+    def _convert(self, x, dtype = None):
+        if x is None:
+            return None
+        elif isinstance(x, Box):
+            length = x.len(self.samplerate)
+            if self._limit is None:
+                self._limit = length
+            else:
+                self._limit = min(self._limit, length)
+            return float(x._value)
+        elif isinstance(x, BaseTrack):
+            return self._open(x, dtype)
+        else:
+            return float(x)
+
+    @staticmethod
+    def _is_constant(x):
+        return not isinstance(x, numpy.ndarray)
+
+    def _get_ramp(self, count):
+        """ Return array 0, 1, ... count - 1 """
+        if len(self._ramp) < count:
+            self._ramp = numpy.arange(count, dtype=numpy.float64)
+        return self._ramp[:count]
+
+    def _get_phases(self, count):
+        """ Return double precision scratch array for count phases """
+        if len(self._phases) < count:
+            self._phases = numpy.empty(count)
+        return self._phases[:count]
+
+    def _fill_phase(self, x, freq, phase):
+        """
+        Write the phase (argument of _func) for next len(x) samples into x.
+        """
+        count = len(x)
+
+        if self._is_constant(freq):
+            # Computed from the absolute position, so that the result
+            # doesn't depend on how the track is split to blocks.
+            numpy.add(self._get_ramp(count), self._position, out=x)
+            x *= freq * self._freq_multiplier
+        else:
+            # x[i] = sum(freq[:i]) * freq_multiplier
+            # The sum runs sequentially from the running accumulator, so that
+            # the result is the same for any split of the track to blocks.
+            x[0] = self._accumulator
+            x[1:] = freq[:count - 1]
+            numpy.cumsum(x, out=x)
+            self._accumulator = x[-1] + freq[count - 1]
+            x *= self._freq_multiplier
+
+        if self._is_constant(phase):
+            if phase != 0:
+                x += phase
+        else:
+            x += phase[:count]
+
+    def _apply_func(self, x, freq):
+        """
+        Evaluate the oscillator function in place on array of phases x.
+        """
+        self._func(x)
+
+    def skip(self, count):
+        if self._limit is not None:
+            count = max(min(count, self._limit - self._position), 0)
+
+        if self._modulated:
+            skipped = count
+            for x in self._params:
+                if x is self._freq or not isinstance(x, Renderer):
+                    continue
+                skipped = min(skipped, x.skip(count))
+
+            if isinstance(self._freq, Renderer):
+                # Only the running sum of frequencies is needed,
+                # summed in the same order as in _fill_phase.
+                remaining = count
+                while remaining:
+                    freq = self._freq.render_block(min(remaining, DEFAULT_BLOCKSIZE))
+                    sums = numpy.empty(len(freq) + 1)
+                    sums[0] = self._accumulator
+                    sums[1:] = freq
+                    self._accumulator = numpy.cumsum(sums)[-1]
+                    remaining -= len(freq)
+                    if not len(freq):
+                        break
+                skipped = min(skipped, count - remaining)
+
+            count = skipped
+
+        self._position += count
+        return count
+
+    def render(self, out):
+        count = len(out)
+        if self._limit is not None:
+            count = min(count, self._limit - self._position)
+
+        params = self._params
+        if self._modulated:
+            # Read blocks of modulated parameters, the oscillator ends
+            # together with the shortest parameter track.
+            # Frequency and phase are always read in double precision.
+            params = [x.render_block(count, numpy.float64 if i < 2 else out.dtype)
+                      if isinstance(x, Renderer) else x
+                      for i, x in enumerate(params)]
+            for x in params:
+                if not self._is_constant(x):
+                    count = min(count, len(x))
+        freq, phase, amplitude, amplitudeHigh, amplitudeLow = params
+
+        if count <= 0:
+            return 0
+
+        values = out[:count]
+        if values.dtype == numpy.float64:
+            phases = values
+        else:
+            # Single precision phase would drift audibly in long tracks
+            phases = self._get_phases(count)
+
+        self._fill_phase(phases, freq, phase)
+        self._apply_func(phases, freq)
+        if phases is not values:
+            values[:] = phases
+        self._position += count
+
+        if amplitude is not None:
+            if not self._is_constant(amplitude):
+                values *= amplitude[:count]
+            elif amplitude != 1:
+                values *= amplitude
+        elif self._is_constant(amplitudeHigh) and self._is_constant(amplitudeLow):
+            values *= (amplitudeHigh - amplitudeLow) * 0.5
+            values += (amplitudeHigh + amplitudeLow) * 0.5
+        else:
+            if not self._is_constant(amplitudeHigh):
+                amplitudeHigh = amplitudeHigh[:count]
+            if not self._is_constant(amplitudeLow):
+                amplitudeLow = amplitudeLow[:count]
+
+            values *= amplitudeHigh - amplitudeLow
+            values += amplitudeHigh
+            values += amplitudeLow
+            values *= 0.5
+
+        return count
+
+
 class SineOscillator(Oscillator):
-    _func = math.sin
+    @staticmethod
+    def _func(x):
+        numpy.sin(x, out=x)
     _period = 2 * math.pi
 
 
 class SawtoothOscillator(Oscillator):
     @staticmethod
     def _func(x):
-        return math.fmod(x + 1, 2) - 1
+        x += 1
+        numpy.mod(x, 2, out=x)
+        x -= 1
     _period = 2
 
 
 class SquareOscillator(Oscillator):
     @staticmethod
     def _func(x):
-        return 1 - math.fmod(int(x), 2) * 2
+        numpy.floor(x, out=x)
+        numpy.mod(x, 2, out=x)
+        x *= -2
+        x += 1
     _period = 2
 
 
 class TriangleOscillator(Oscillator):
     @staticmethod
     def _func(x):
-        return 1 - math.fabs(math.fmod(x + 1, 4) - 2)
+        x += 1
+        numpy.mod(x, 4, out=x)
+        x -= 2
+        numpy.abs(x, out=x)
+        numpy.subtract(1, x, out=x)
     _period = 4
+
+
+_mipmap_cache = {}
+
+def _mipmap(waveform, table_size):
+    """
+    Return 2D array with band limited single cycle tables of the waveform
+    (an Oscillator subclass). Level i contains only harmonics up to
+    table_size / 2**(i + 1), each table has one extra sample for interpolation.
+    The tables are shared by all instances.
+    """
+    key = (waveform, table_size)
+    try:
+        return _mipmap_cache[key]
+    except KeyError:
+        pass
+
+    cycle = numpy.arange(table_size) * (waveform._period / table_size)
+    waveform._func(cycle)
+    spectrum = numpy.fft.rfft(cycle)
+
+    levels = []
+    harmonics = table_size // 2
+    while harmonics > 0:
+        limited = spectrum.copy()
+        limited[harmonics + 1:] = 0
+        levels.append(numpy.fft.irfft(limited, table_size))
+        harmonics //= 2
+
+    tables = numpy.array(levels)
+    tables = numpy.append(tables, tables[:, :1], axis = 1)
+
+    tables.setflags(write=False)
+
+    # Concurrent renders may compute the same tables, only one copy is kept
+    return _mipmap_cache.setdefault(key, tables)
+
+
+class WavetableOscillator(Oscillator):
+    """
+    Oscillator that reads the waveform of an other oscillator class from
+    precomputed, linearly interpolated tables.
+    The tables are band limited with one level per octave, so unlike
+    the naive oscillators this one doesn't alias at high frequencies.
+    Phase is in the units of the waveform's period.
+    """
+
+    def __init__(self, freq, waveform = SineOscillator, table_size = 2048, **kwargs):
+        super(WavetableOscillator, self).__init__(freq, **kwargs)
+        self._waveform = waveform
+        self._table_size = table_size
+
+    @property
+    def _period(self):
+        return self._waveform._period
+
+    def _renderer(self, samplerate, open_input = None):
+        return _WavetableRenderer(self, samplerate, open_input)
+
+
+class _WavetableRenderer(_OscillatorRenderer):
+    def __init__(self, oscillator, samplerate, open_input = None):
+        super(_WavetableRenderer, self).__init__(oscillator, samplerate, open_input)
+        self._table_size = oscillator._table_size
+        self._tables = _mipmap(oscillator._waveform, oscillator._table_size)
+
+    def _levels(self, freq):
+        """
+        Return index of the table level that doesn't alias at frequency freq.
+        """
+        harmonics_ratio = numpy.abs(freq) * (self._table_size / self.samplerate)
+        level = numpy.ceil(numpy.log2(numpy.maximum(harmonics_ratio, 1)))
+        return numpy.minimum(level, len(self._tables) - 1).astype(numpy.intp)
+
+    def _apply_func(self, x, freq):
+        size = self._table_size
+
+        x *= size / self._period
+        numpy.mod(x, size, out=x)
+        index = x.astype(numpy.intp)
+        numpy.minimum(index, size - 1, out=index)
+        x -= index
+
+        if self._is_constant(freq):
+            table = self._tables[self._levels(freq)]
+            a = table[index]
+            b = table[index + 1]
+        else:
+            levels = self._levels(freq[:len(x)])
+            a = self._tables[levels, index]
+            b = self._tables[levels, index + 1]
+
+        b -= a
+        x *= b
+        x += a
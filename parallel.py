@@ -0,0 +1,126 @@
+import os
+import concurrent.futures
+import numpy
+
+from . import cache
+from .tracks import DEFAULT_DTYPE
+
+def _render_part(track, samplerate, length, dtype):
+    if length is None:
+        return track.as_array(samplerate, dtype = dtype)
+    else:
+        return track.renderer(samplerate).render_block(length, dtype)
+
+def _unique(parts, samplerate, length):
+    """
+    Group parts that render the same data.
+    Returns list of jobs (track, length) and list of job indices for each part.
+    """
+    jobs = []
+    keys = {}
+    indices = []
+
+    for offset, track in parts:
+        if length is None:
+            part_length = None
+        else:
+            # Parts that end before the rendered length are rendered whole,
+            # so that identical parts at different offsets share a job
+            part_length = length - offset
+            track_length = track.len(samplerate)
+            if track_length < part_length:
+                part_length = int(track_length)
+        try:
+            key = (cache.structure_key(track), part_length)
+        except TypeError:
+            key = (id(track), part_length)
+
+        if key not in keys:
+            keys[key] = len(jobs)
+            jobs.append((track, part_length))
+        indices.append(keys[key])
+
+    return jobs, indices
+
+def render(track, samplerate, length = None, processes = None,
+           dtype = DEFAULT_DTYPE):
+    """
+    Render the track to numpy array, using a pool of processes.
+    Tracks that sum independent branches (Mixer, Sequencer, Repeat) have
+    their branches rendered in parallel, identical branches only once.
+    The result is bit for bit identical to serial rendering.
+    Other tracks are rendered serially.
+
+    Parameters:
+        length: Render only this many samples. Required for infinite tracks.
+        processes: Number of worker processes, None to use all cores.
+        dtype: Float dtype to render in.
+    """
+    if length is None and track.len(samplerate) == float('inf'):
+        raise Exception("Length must be given for infinite tracks.")
+
+    split = track._parts(samplerate, length)
+
+    if split is None:
+        return _render_part(track, samplerate, length, dtype)
+
+    parts, end = split
+    jobs, indices = _unique(parts, samplerate, length)
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(_render_part, job_track, samplerate,
+                                   job_length, dtype)
+                   for job_track, job_length in jobs]
+        buffers = [future.result() for future in futures]
+
+    total = max([end] + [offset + len(buffers[index])
+                         for (offset, part), index in zip(parts, indices)])
+    if length is not None:
+        total = min(total, length)
+
+    # Summed in the same order as the serial mixer does
+    out = numpy.zeros(total, dtype)
+    for (offset, part), index in zip(parts, indices):
+        data = buffers[index][:total - offset]
+        out[offset:offset + len(data)] += data
+
+    return out
+
+def _render_segment(track, samplerate, start, end, dtype):
+    return track.as_array(samplerate, start, end, dtype)
+
+def render_segments(track, samplerate, length = None, segment = None,
+                    processes = None, dtype = DEFAULT_DTYPE):
+    """
+    Render the track to numpy array by splitting it to time segments
+    that are rendered in parallel processes and concatenated.
+    Each segment seeks to its start, so the result is identical to serial
+    rendering for tracks that seek exactly (oscillators, envelopes,
+    sequencers) and matches it up to the noise floor for echoes.
+
+    Parameters:
+        length: Render only this many samples. Required for infinite tracks.
+        segment: Length of a segment in samples, None to split the track
+            evenly between the processes.
+        processes: Number of worker processes, None to use all cores.
+        dtype: Float dtype to render in.
+    """
+    if length is None:
+        length = track.len(samplerate)
+        if length == float('inf'):
+            raise Exception("Length must be given for infinite tracks.")
+    length = int(length)
+
+    if segment is None:
+        segment = -(-length // (processes or os.cpu_count() or 1))
+    starts = range(0, length, max(segment, 1))
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(_render_segment, track, samplerate,
+                                   start, min(start + segment, length), dtype)
+                   for start in starts]
+        segments = [future.result() for future in futures]
+
+    if not segments:
+        return numpy.empty(0, dtype)
+    return numpy.concatenate(segments)
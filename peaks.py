@@ -0,0 +1,115 @@
+import collections
+import numpy
+
+from .tracks import DEFAULT_BLOCKSIZE
+
+PeakLevel = collections.namedtuple('PeakLevel', ['bin_size', 'min', 'max', 'rms'])
+
+
+class PeakPyramid:
+    """
+    Multi resolution summary of a track: levels of min, max and RMS values
+    over bins of bin_size samples, each level has factor times larger bins
+    than the previous one. The last bin of a level may be shorter.
+    """
+
+    def __init__(self, levels, samplerate, start, length):
+        """
+        Parameters:
+            levels: List of PeakLevel, from the finest.
+            start: Index of the first summarized sample.
+            length: Number of summarized samples.
+        """
+        self.levels = levels
+        self.samplerate = samplerate
+        self.start = start
+        self.length = length
+
+    def level(self, bins):
+        """
+        Return the coarsest level with at least bins bins
+        (or the finest one if there is none).
+        """
+        for level in reversed(self.levels):
+            if len(level.min) >= bins:
+                return level
+        return self.levels[0]
+
+    def times(self, level):
+        """
+        Return times of bin centers of a level in seconds.
+        """
+        centers = numpy.arange(len(level.min)) * level.bin_size + level.bin_size / 2
+        numpy.minimum(centers, self.length, out=centers)
+        return (self.start + centers) / self.samplerate
+
+
+def _reduce(values, operation, factor):
+    return operation.reduceat(values, numpy.arange(0, len(values), factor))
+
+def summarize(track, samplerate, start = 0, end = None, bin_size = 256, factor = 4,
+              blocksize = 16 * DEFAULT_BLOCKSIZE):
+    """
+    Compute PeakPyramid of the track in a single pass over its blocks.
+    Memory use is proportional to the number of bins only.
+
+    Parameters:
+        start: Start of the summarized window in seconds.
+        end: End of the window in seconds, None for the end of the track.
+            Required for infinite tracks.
+        bin_size: Size of the finest bins in samples.
+        factor: Ratio of bin sizes of consecutive levels.
+    """
+    first = int(round(start * samplerate))
+    if end is None:
+        if track.len(samplerate) == float('inf'):
+            raise Exception("Summarizing an infinite track needs end.")
+        remaining = float('inf')
+    else:
+        remaining = max(int(round(end * samplerate)) - first, 0)
+
+    blocksize -= blocksize % bin_size
+    mins = []
+    maxs = []
+    squares = []
+    length = 0
+
+    for block in track.as_arrays_iter(samplerate, max(blocksize, bin_size),
+                                      zfill = False, start = first):
+        if len(block) > remaining:
+            block = block[:remaining]
+        remaining -= len(block)
+        length += len(block)
+
+        starts = numpy.arange(0, len(block), bin_size)
+        mins.append(numpy.minimum.reduceat(block, starts))
+        maxs.append(numpy.maximum.reduceat(block, starts))
+        squares.append(numpy.add.reduceat(block * block, starts))
+
+        if not remaining:
+            break
+
+    if not length:
+        empty = numpy.empty(0)
+        return PeakPyramid([PeakLevel(bin_size, empty, empty, empty)],
+                           samplerate, first, 0)
+
+    mins = numpy.concatenate(mins)
+    maxs = numpy.concatenate(maxs)
+    squares = numpy.concatenate(squares)
+    counts = numpy.full(len(mins), bin_size)
+    counts[-1] = length - (len(mins) - 1) * bin_size
+
+    levels = []
+    while True:
+        levels.append(PeakLevel(bin_size, mins, maxs, numpy.sqrt(squares / counts)))
+        if len(mins) <= 1:
+            break
+
+        mins = _reduce(mins, numpy.minimum, factor)
+        maxs = _reduce(maxs, numpy.maximum, factor)
+        squares = _reduce(squares, numpy.add, factor)
+        counts = _reduce(counts, numpy.add, factor)
+        bin_size *= factor
+
+    return PeakPyramid(levels, samplerate, first, length)
@@ -0,0 +1,226 @@
+import collections
+import threading
+import numpy
+
+from .tracks import DEFAULT_BLOCKSIZE
+
+class RingBuffer:
+    """
+    Single producer, single consumer ring buffer of samples.
+    The write counter is only changed by the producer and the read counter
+    only by the consumer, each after its data is copied, so no locks are
+    needed. Events only wake up a side that waits for the other.
+    """
+
+    def __init__(self, capacity, dtype = numpy.float32):
+        self._data = numpy.zeros(capacity, dtype)
+        self._written = 0
+        self._read = 0
+        self._data_ready = threading.Event()
+        self._space_ready = threading.Event()
+        self.closed = False
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def fill(self):
+        """ Number of samples waiting to be read. """
+        return self._written - self._read
+
+    def _copy(self, position, count, write):
+        """
+        Split count samples starting at counter position to at most
+        two slices of the buffer and pass them to write(slice, offset).
+        """
+        capacity = len(self._data)
+        start = position % capacity
+        first = min(count, capacity - start)
+        write(self._data[start:start + first], 0)
+        if first < count:
+            write(self._data[:count - first], first)
+
+    def write(self, data):
+        """
+        Write as much of data as fits. Returns number of samples written.
+        Producer side only.
+        """
+        count = min(len(data), len(self._data) - self.fill())
+        def copy(chunk, offset):
+            chunk[:] = data[offset:offset + len(chunk)]
+        self._copy(self._written, count, copy)
+
+        self._written += count
+        self._data_ready.set()
+        return count
+
+    def read(self, out):
+        """
+        Read at most len(out) samples into out. Returns number of samples read.
+        Consumer side only.
+        """
+        count = min(len(out), self.fill())
+        def copy(chunk, offset):
+            out[offset:offset + len(chunk)] = chunk
+        self._copy(self._read, count, copy)
+
+        self._read += count
+        self._space_ready.set()
+        return count
+
+    def close(self):
+        """
+        Mark that no more data will be written. Producer side only.
+        """
+        self.closed = True
+        self._data_ready.set()
+
+    def wait_for_data(self, count, timeout = None):
+        """
+        Wait until at least count samples can be read or the buffer is closed.
+        """
+        self._data_ready.clear()
+        if self.fill() < count and not self.closed:
+            self._data_ready.wait(timeout)
+
+    def wait_for_space(self, count, timeout = None):
+        """
+        Wait until at least count samples can be written.
+        """
+        self._space_ready.clear()
+        if len(self._data) - self.fill() < count:
+            self._space_ready.wait(timeout)
+
+
+PlaybackStats = collections.namedtuple(
+    'PlaybackStats', ['frames', 'xruns', 'fill', 'min_fill', 'latency', 'max_latency'])
+
+
+class Player:
+    """
+    Plays a track through a PCM device with a producer thread that renders
+    ahead into a ring buffer of depth samples. The calling thread drains
+    the ring buffer into the device one period at a time.
+    Rendering in large blocks keeps the throughput high, while the output
+    latency is bounded by the ring buffer depth.
+
+    The device only needs a write(data) method taking a buffer of periodsize
+    float32 samples and returning number of frames written; zero or
+    negative return values count as device xruns.
+    """
+
+    def __init__(self, track, pcm, samplerate, periodsize = 32,
+                 blocksize = DEFAULT_BLOCKSIZE, depth = 4 * DEFAULT_BLOCKSIZE):
+        if depth < periodsize:
+            raise Exception("Ring buffer must hold at least one period.")
+
+        self.samplerate = samplerate
+        self._track = track
+        self._pcm = pcm
+        self._periodsize = periodsize
+        self._blocksize = blocksize
+        self._ring = RingBuffer(depth)
+
+        self._thread = None
+        self._error = None
+        self._stopped = False
+
+        self.frames = 0
+        self.xruns = 0
+        self.min_fill = depth
+
+    def _produce(self):
+        try:
+            renderer = self._track.renderer(self.samplerate)
+            block = numpy.empty(self._blocksize, numpy.float32)
+
+            while not self._stopped:
+                count = renderer.render(block)
+                values = block[:count]
+                numpy.clip(values, -1, 1, out=values)
+
+                while len(values) and not self._stopped:
+                    values = values[self._ring.write(values):]
+                    if len(values):
+                        self._ring.wait_for_space(min(len(values), self._periodsize), 0.1)
+
+                if count < len(block):
+                    break
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._ring.close()
+
+    def start(self):
+        """
+        Start the producer thread, without playing.
+        """
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the playback, can be called from any thread.
+        """
+        self._stopped = True
+
+    def run(self):
+        """
+        Play the whole track, returns once it's finished.
+        The ring buffer is filled before the playback starts.
+        """
+        if self._thread is None:
+            self.start()
+
+        ring = self._ring
+        periodsize = self._periodsize
+        period = numpy.empty(periodsize, numpy.float32)
+
+        try:
+            while not self._stopped and not ring.closed and ring.fill() < ring.capacity:
+                ring.wait_for_data(ring.capacity, 0.1)
+
+            while not self._stopped:
+                if not ring.closed:
+                    # Fill at the end of the track doesn't count
+                    self.min_fill = min(self.min_fill, ring.fill())
+
+                if ring.fill() < periodsize and not ring.closed:
+                    # The producer fell behind, the device will run dry
+                    self.xruns += 1
+                    while not self._stopped and ring.fill() < periodsize and not ring.closed:
+                        ring.wait_for_data(periodsize, 0.1)
+
+                count = ring.read(period)
+                if not count:
+                    break
+
+                if count < periodsize:
+                    # The device might not play a partial last period
+                    period[count:] = 0
+                if self._pcm.write(period.data) <= 0:
+                    self.xruns += 1
+                self.frames += count
+        finally:
+            self._stopped = True
+            self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        return self.stats()
+
+    def stats(self):
+        """
+        Return PlaybackStats with frames played, number of xruns,
+        current and minimal ring buffer fill (in samples) and
+        current and maximal latency (in seconds).
+        """
+        fill = self._ring.fill()
+        return PlaybackStats(
+            frames = self.frames,
+            xruns = self.xruns,
+            fill = fill,
+            min_fill = self.min_fill,
+            latency = (fill + self._periodsize) / self.samplerate,
+            max_latency = (self._ring.capacity + self._periodsize) / self.samplerate)
@@ -0,0 +1,288 @@
+import json
+import threading
+import time
+import tracemalloc
+
+from . import compiler
+from .tracks import BaseTrack, Renderer
+
+_active = None
+
+
+class _Node:
+    """
+    Statistics of rendering one track at one place of the track tree.
+    """
+    def __init__(self, track):
+        self.track = track
+        self.children = {} # id(track) -> _Node
+        self.renderers = 0
+        self.calls = 0
+        self.samples = 0
+        self.self_time = 0
+        self.allocated = 0
+        self.peak_allocated = 0
+
+    def child(self, track):
+        try:
+            return self.children[id(track)]
+        except KeyError:
+            node = _Node(track)
+            self.children[id(track)] = node
+            return node
+
+    def _ordered_children(self):
+        """
+        Children in the order of the track's slaves, slaves that were never
+        rendered (constant parameters, ...) get empty nodes.
+        Tracks rendered by the track that are not its slaves follow.
+        """
+        ret = []
+        seen = set()
+        for slave in self.track._slaves:
+            if id(slave) not in seen:
+                seen.add(id(slave))
+                ret.append(self.children.get(id(slave)) or _Node(slave))
+        ret.extend(node for key, node in self.children.items() if key not in seen)
+        return ret
+
+    def report(self, memory):
+        children = [node.report(memory) for node in self._ordered_children()]
+        ret = {
+            'name': self.track.name,
+            'renderers': self.renderers,
+            'calls': self.calls,
+            'samples': self.samples,
+            'time': self.self_time + sum(child['time'] for child in children),
+            'self_time': self.self_time,
+        }
+        if memory:
+            ret['allocated'] = self.allocated
+            ret['peak_allocated'] = self.peak_allocated
+        ret['children'] = children
+        return ret
+
+
+class _Frame:
+    __slots__ = ('node', 'start', 'child_time', 'memory_start', 'peak')
+
+
+class _ProfiledRenderer(Renderer):
+    """
+    Wraps a renderer and records its calls in a node.
+    """
+    def __init__(self, renderer, node, profiler):
+        super(_ProfiledRenderer, self).__init__(renderer.samplerate)
+        self._renderer = renderer
+        self._node = node
+        self._profiler = profiler
+
+    def render(self, out):
+        frame = self._profiler._push(self._node)
+        try:
+            count = self._renderer.render(out)
+        finally:
+            self._profiler._pop(frame)
+        self._node.samples += count
+        return count
+
+    def skip(self, count):
+        frame = self._profiler._push(self._node)
+        try:
+            return self._renderer.skip(count)
+        finally:
+            self._profiler._pop(frame)
+
+    def __getattr__(self, name):
+        return getattr(self._renderer, name)
+
+
+class Profiler:
+    """
+    Records wall time, produced samples, number of calls and (optionally)
+    memory allocations of every renderer created while the profiler is
+    active, arranged in a tree that mirrors the tracks' slaves.
+
+    Used as a context manager:
+
+        with profiler.Profiler() as p:
+            track.as_array(44100)
+        print(p.to_json())
+
+    Profiling replaces BaseTrack.renderer for the duration of the with
+    block only, so that there is no cost at all when it is not active.
+    Only renderers created inside the block are profiled, renderers in
+    the worker processes of parallel rendering are not.
+
+    Times of a node are self times, without the time spent rendering its
+    inputs, total times are summed over the subtree in the report.
+    In compiled plans all steps are profiled, inputs are rendered before
+    the steps that read them.
+    """
+
+    def __init__(self, memory = False):
+        """
+        Parameters:
+            memory: If True, record memory allocated during the calls
+                (through tracemalloc, makes the rendering much slower).
+                Allocations of a node include its inputs rendered
+                during the call.
+        """
+        self._memory = memory
+        self._root = _Node(BaseTrack())
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._saved = None
+        self._stop_tracemalloc = False
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise Exception("Only one profiler can be active at a time.")
+        _active = self
+
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._stop_tracemalloc = True
+
+        self._saved = (BaseTrack.renderer, compiler.Plan._compile)
+        BaseTrack.renderer = self._wrap_renderer(BaseTrack.renderer)
+        compiler.Plan._compile = self._wrap_compile(compiler.Plan._compile)
+        return self
+
+    def __exit__(self, *args):
+        global _active
+        BaseTrack.renderer, compiler.Plan._compile = self._saved
+        self._saved = None
+
+        if self._stop_tracemalloc:
+            tracemalloc.stop()
+            self._stop_tracemalloc = False
+
+        _active = None
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _current(self):
+        stack = self._stack()
+        if stack:
+            return stack[-1].node
+        return self._root
+
+    def _push(self, node):
+        frame = _Frame()
+        frame.node = node
+        frame.child_time = 0
+        frame.peak = 0
+        stack = self._stack()
+
+        if self._memory:
+            frame.memory_start, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Peak is shared, keep what the parent reached so far
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+
+        stack.append(frame)
+        frame.start = time.perf_counter()
+        return frame
+
+    def _pop(self, frame, call = True):
+        elapsed = time.perf_counter() - frame.start
+        stack = self._stack()
+        stack.pop()
+        node = frame.node
+
+        if self._memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame.peak)
+            allocated = peak - frame.memory_start
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+
+        if stack:
+            stack[-1].child_time += elapsed
+
+        with self._lock:
+            node.self_time += elapsed - frame.child_time
+            if call:
+                node.calls += 1
+            else:
+                node.renderers += 1
+            if self._memory:
+                node.allocated += allocated
+                node.peak_allocated = max(node.peak_allocated, allocated)
+
+    def _node(self, track):
+        with self._lock:
+            return self._current().child(track)
+
+    def _wrap_renderer(self, renderer):
+        def profiled_renderer(track, samplerate, start = 0):
+            node = self._node(track)
+            frame = self._push(node)
+            try:
+                ret = renderer(track, samplerate, start)
+            finally:
+                self._pop(frame, call = False)
+            return _ProfiledRenderer(ret, node, self)
+        return profiled_renderer
+
+    def _wrap_compile(self, compile):
+        def profiled_compile(plan, track):
+            if not track._dataflow:
+                # Goes through BaseTrack.renderer
+                return compile(plan, track)
+
+            node = self._node(track)
+            frame = self._push(node)
+            try:
+                renderer, inputs = compile(plan, track)
+            finally:
+                self._pop(frame, call = False)
+            return _ProfiledRenderer(renderer, node, self), inputs
+        return profiled_compile
+
+    def report(self):
+        """
+        Return list of trees of dicts with statistics, one for every track
+        rendered directly.
+        Each dict has keys name, renderers, calls, samples, time, self_time,
+        (allocated, peak_allocated if memory is enabled) and children.
+        """
+        return [node.report(self._memory) for node in self._root.children.values()]
+
+    def to_json(self, **kwargs):
+        """
+        Return the report as JSON string, kwargs are passed to json.dumps.
+        """
+        return json.dumps(self.report(), **kwargs)
+
+    def describe(self):
+        """
+        Return list of strings describing the tree.
+        """
+        ret = []
+        def add(node, depth):
+            ret.append("{}{}: {:.3f} s ({:.3f} s self), {} calls, {} samples".format(
+                "  " * depth, node['name'], node['time'], node['self_time'],
+                node['calls'], node['samples']))
+            for child in node['children']:
+                add(child, depth + 1)
+        for node in self.report():
+            add(node, 0)
+        return ret
+
+
+def profile(track, samplerate, memory = False, **kwargs):
+    """
+    Render the whole track once (through as_array) and return its Profiler.
+    kwargs are passed to as_array.
+    """
+    with Profiler(memory) as ret:
+        track.as_array(samplerate, **kwargs)
+    return ret
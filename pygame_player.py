@@ -3,42 +3,84 @@ import pygame.locals
 import pygame.sndarray
 import numpy
 
-import struct
-import itertools
-import math
+from .tracks import DEFAULT_BLOCKSIZE
+from . import playback
 
 _maximum = 2**15 - 1
 
-def _next_block(it):
-    values = next(it)
-    numpy.clip(values, -1, 1, out=values)
-    values *= _maximum
-    values = numpy.array(values, numpy.int16)
-    #print(values)
+class _SoundQueue:
+    """
+    Device for playback.Player playing through a pygame channel.
+    Keeps a small pool of Sounds whose buffers are refilled in place.
+    A channel holds one playing and one queued sound, so with three sounds
+    the one being filled has always finished playing.
+    """
 
-    return pygame.sndarray.make_sound(values)
+    def __init__(self, periodsize, pool_size = 3):
+        channels = pygame.mixer.get_init()[2]
+        shape = (periodsize,) if channels == 1 else (periodsize, channels)
 
-def play(track, samplerate=44100, blocksize=4096):
-    pygame.mixer.init(samplerate, -16, 1, blocksize)
-    pygame.display.init() # Needed for events ...
+        self._channel = pygame.mixer.Channel(0)
+        self._channel.set_endevent(pygame.locals.USEREVENT)
+        self._sounds = [pygame.sndarray.make_sound(numpy.zeros(shape, numpy.int16))
+                        for i in range(pool_size)]
+        self._samples = [pygame.sndarray.samples(sound) for sound in self._sounds]
+        self._next = 0
+        self._started = False
 
-    try:
-        channel = pygame.mixer.Channel(0)
-        channel.set_endevent(pygame.locals.USEREVENT)
+    def write(self, data):
+        """
+        Fill the next sound and queue it once the channel has room.
+        Returns 0 if the channel ran dry before the sound was queued.
+        """
+        values = numpy.frombuffer(data, numpy.float32)
+        samples = self._samples[self._next]
+        sound = self._sounds[self._next]
+        self._next = (self._next + 1) % len(self._sounds)
 
-        it = track.as_arrays_iter(samplerate, blocksize, None)
+        if samples.ndim > 1:
+            values = values[:, numpy.newaxis]
+        numpy.multiply(values, _maximum, out=samples[:len(values)], casting='unsafe')
+        samples[len(values):] = 0 # The last block is zero padded
 
-        channel.play(_next_block(it))
-        channel.queue(_next_block(it))
+        while self._channel.get_queue() is not None:
+            pygame.event.wait()
 
-        while True:
-            event = pygame.event.wait()
+        if self._channel.get_busy():
+            self._channel.queue(sound)
+            return len(values)
 
-            if event.type == pygame.locals.USEREVENT:
-                channel.queue(_next_block(it))
+        self._channel.play(sound)
+        late = self._started
+        self._started = True
+        return 0 if late else len(values)
 
-    except StopIteration:
-        while channel.get_busy():
+    def drain(self):
+        """
+        Wait until everything queued has played.
+        """
+        while self._channel.get_busy():
             pygame.event.wait()
+
+def play(track, samplerate=44100, blocksize=DEFAULT_BLOCKSIZE, periodsize=512,
+         depth=4 * DEFAULT_BLOCKSIZE):
+    """
+    Play a track through pygame.
+    Blocks of blocksize samples are prefetched by a render thread
+    (see playback.Player) and played from a pool of reused sounds
+    of periodsize samples.
+    Returns playback.PlaybackStats, late blocks are counted as xruns.
+    """
+    pygame.mixer.init(samplerate, -16, 1, periodsize)
+    pygame.display.init() # Needed for events ...
+
+    try:
+        samplerate = pygame.mixer.get_init()[0]
+        device = _SoundQueue(periodsize)
+        player = playback.Player(track, device, samplerate, periodsize,
+                                 blocksize, depth)
+        stats = player.run()
+        device.drain()
+        return stats
     finally:
         pygame.quit()
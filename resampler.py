@@ -0,0 +1,178 @@
+import fractions
+import math
+import numpy
+
+from . import util
+from .tracks import BaseTrack, Renderer
+
+@util.memoize(maxsize = 32)
+def _filter_bank(mode, up, down, zero_crossings):
+    """
+    Return read only (up, taps) array of filters for resampling by up / down.
+    Row p interpolates at p / up samples after an input sample, from inputs
+    -taps / 2 + 1 to taps / 2 relative to it.
+    """
+    if mode == 'linear':
+        phases = numpy.arange(up) / up
+        bank = numpy.column_stack((1 - phases, phases))
+    elif mode == 'sinc':
+        # Cutoff below both Nyquist frequencies, filter is longer when
+        # downsampling so that the transition band stays the same
+        cutoff = min(1, up / down)
+        half = int(math.ceil(zero_crossings / cutoff))
+        distance = (numpy.arange(-half + 1, half + 1)[numpy.newaxis, :] -
+                    numpy.arange(up)[:, numpy.newaxis] / up)
+
+        beta = 8.6
+        window = numpy.i0(beta * numpy.sqrt(numpy.clip(1 - (distance / half)**2, 0, 1)))
+        bank = cutoff * numpy.sinc(cutoff * distance) * window / numpy.i0(beta)
+        # Unity gain at DC for every phase
+        bank /= bank.sum(axis = 1, keepdims = True)
+    else:
+        raise Exception("Unknown resampling mode {!r}".format(mode))
+
+    bank.setflags(write=False)
+    return bank
+
+
+class _ResamplerRenderer(Renderer):
+    """
+    Keeps a window of input samples starting at _buffer_start (may be
+    negative, inputs before the start of the track are zeros).
+    Output sample n lies between inputs (n * down) // up and the next one.
+    """
+
+    def __init__(self, resampler, samplerate):
+        super(_ResamplerRenderer, self).__init__(samplerate)
+        ratio = fractions.Fraction(int(samplerate), int(resampler.source_samplerate))
+        self._up = ratio.numerator
+        self._down = ratio.denominator
+
+        self._bank = _filter_bank(resampler._mode, self._up, self._down,
+                                  resampler._zero_crossings)
+        self._taps = self._bank.shape[1]
+        self._half = self._taps // 2
+
+        self._input = resampler._slaves[0].renderer(resampler.source_samplerate)
+        self._input_length = None # Known once the input ends
+        self._buffer = numpy.zeros(self._half - 1)
+        self._buffer_start = -(self._half - 1)
+        self._position = 0
+
+    def _end(self):
+        """ Number of output samples, None if not known yet. """
+        if self._input_length is None:
+            return None
+        return -(-self._input_length * self._up // self._down)
+
+    def _read_until(self, stop):
+        """
+        Extend the buffer to contain inputs up to (excluding) stop.
+        """
+        missing = stop - (self._buffer_start + len(self._buffer))
+        if missing <= 0:
+            return
+
+        block = numpy.zeros(missing)
+        if self._input_length is None:
+            count = self._input.render(block)
+            if count < missing:
+                self._input_length = self._buffer_start + len(self._buffer) + count
+        self._buffer = numpy.concatenate((self._buffer, block))
+
+    def _drop_before(self, start):
+        """
+        Drop inputs before start from the buffer.
+        Inputs that weren't read yet are read later.
+        """
+        drop = min(start - self._buffer_start, len(self._buffer))
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+
+    def render(self, out):
+        count = len(out)
+        n = numpy.arange(self._position, self._position + count, dtype = numpy.int64)
+        n *= self._down
+        first = n // self._up
+
+        self._read_until(int(first[-1]) + self._half + 1 if count else 0)
+        end = self._end()
+        if end is not None:
+            count = max(min(count, end - self._position), 0)
+            n = n[:count]
+            first = first[:count]
+        if not count:
+            return 0
+
+        phases = n % self._up
+        first += -self._half + 1 - self._buffer_start
+        indices = first[:, numpy.newaxis] + numpy.arange(self._taps)
+        numpy.einsum('ij,ij->i', self._buffer[indices], self._bank[phases],
+                     out = out[:count], casting = 'same_kind')
+
+        self._position += count
+        self._drop_before((self._position * self._down) // self._up - self._half + 1)
+        return count
+
+    def skip(self, count):
+        end = self._end()
+        if end is not None:
+            count = max(min(count, end - self._position), 0)
+
+        self._position += count
+        start = (self._position * self._down) // self._up - self._half + 1
+        buffered = self._buffer_start + len(self._buffer)
+        if start > buffered and self._input_length is None:
+            skipped = self._input.skip(start - buffered)
+            if skipped < start - buffered:
+                self._input_length = buffered + skipped
+            self._buffer = numpy.zeros(0)
+            self._buffer_start = buffered + skipped
+        self._drop_before(start)
+
+        end = self._end()
+        if end is not None and self._position > end:
+            count -= self._position - end
+            self._position = end
+        return count
+
+
+class Resampler(BaseTrack):
+    """
+    Converts a track with fixed samplerate (NumpyTrack, WavFileTrack,
+    recordings) to any samplerate.
+    In 'sinc' mode a polyphase bank of Kaiser windowed sinc filters with
+    zero_crossings on each side is used, in 'linear' mode samples are only
+    linearly interpolated (cheap, for previews).
+    Filter banks are shared by all resamplers with the same ratio.
+    """
+
+    def __init__(self, track, source_samplerate = None, mode = 'sinc',
+                 zero_crossings = 16):
+        """
+        Parameters:
+            source_samplerate: Samplerate to render the track at, defaults
+                to the track's samplerate attribute.
+        """
+        super(Resampler, self).__init__(track)
+        if source_samplerate is None:
+            source_samplerate = track.samplerate
+        if mode not in ('sinc', 'linear'):
+            raise Exception("Unknown resampling mode {!r}".format(mode))
+
+        self.source_samplerate = source_samplerate
+        self._mode = mode
+        self._zero_crossings = zero_crossings
+
+    def _renderer(self, samplerate):
+        if samplerate == self.source_samplerate:
+            return self._slaves[0].renderer(samplerate)
+        return _ResamplerRenderer(self, samplerate)
+
+    def len(self, samplerate):
+        length = self._slaves[0].len(self.source_samplerate)
+        if length == float('inf') or samplerate == self.source_samplerate:
+            return length
+        ratio = fractions.Fraction(int(samplerate), int(self.source_samplerate))
+        return -(-length * ratio.numerator // ratio.denominator)
@@ -1,7 +1,10 @@
 import math
 import itertools
 
-from .tracks import BaseTrack
+import numpy
+
+from .tracks import BaseTrack, Renderer, NumpyTrack
+from .mixer import Mixer
 
 class Rhythm:
     """
@@ -42,17 +45,33 @@ class Rhythm:
                 yield False
             i += 1
 
+    def trigger_positions(self, beats, samplerate):
+        """
+        Returns numpy array of sample indices where the given beats
+        (array of beat numbers) fall. Matches trigger_iterator.
+        """
+        # The small tolerance keeps beats that fall exactly on a sample there
+        positions = numpy.asarray(beats) * (self._spb * samplerate) - 1e-9
+        return numpy.ceil(positions).astype(numpy.int64)
+
     __call__ = time
 
     def __str__(self):
         return "Rhythm @ {} bpm, {} beats per measure".format(self.bpm, self.measure_len)
 
 class Repeat(BaseTrack):
-    def __init__(self, track, rhythm, beat_set, repeat_period = None):
+    def __init__(self, track, rhythm, beat_set, repeat_period = None, cache_hit = True):
+        """
+        Repeat the track on every beat from beat_set, with period of
+        repeat_period beats (defaults to whole measures).
+        If cache_hit is True and the track is finite, it is rendered only
+        once and the result is reused for every hit.
+        """
         super(Repeat, self).__init__()
         self._track = track
         self._rhythm = rhythm
         self._beat_set = beat_set
+        self._cache_hit = cache_hit
 
         if repeat_period is None:
             self._modulus = (max(beat_set) // rhythm.measure_len + 1) * rhythm.measure_len
@@ -61,25 +80,78 @@ class Repeat(BaseTrack):
 
         self.add_slave(track)
 
-    def as_iter(self, samplerate, offset = 0):
-        beat_set = {int(self._rhythm.time(x) * samplerate) for x in self._beat_set}
-        modulus = int(self._rhythm.time(self._modulus) * samplerate)
+    def _hit(self, samplerate):
+        """
+        Return the track to start on every hit.
+        """
+        if self._cache_hit and self._track.len(samplerate) < float('inf'):
+            return NumpyTrack(self._track.as_array(samplerate), samplerate)
+        else:
+            return self._track
+
+    def _renderer(self, samplerate):
+        return _RepeatRenderer(self, samplerate)
+
+    def _parts(self, samplerate, length):
+        if length is None:
+            return None
 
-        started = []
+        renderer = _RepeatRenderer(self, samplerate)
+        return [(int(position), renderer._hit)
+                for position in renderer._triggers(0, length)], length
 
-        for i in itertools.count(offset):
-            if (i % modulus) in beat_set:
-                started.append(self._track.as_iter(samplerate, i))
+    def len(self, samplerate):
+        return float('inf')
 
-            new_started = []
-            out = 0
-            for it in started:
-                try:
-                    out += next(it)
-                except StopIteration:
-                    pass
-                else:
-                    new_started.append(it)
 
-            started = new_started
-            yield out
+class _RepeatRenderer(Renderer):
+    def __init__(self, repeat, samplerate):
+        super(_RepeatRenderer, self).__init__(samplerate)
+        self._hit = repeat._hit(samplerate)
+        self._modulus = int(repeat._rhythm.time(repeat._modulus) * samplerate)
+        self._beats = numpy.array(sorted(
+            {int(repeat._rhythm.time(x) * samplerate) for x in repeat._beat_set}),
+            dtype=numpy.int64)
+        self._beats = self._beats[self._beats < self._modulus]
+        self._mixer = Mixer(samplerate)
+        self._position = 0
+        self._hit_length = None
+
+    def _triggers(self, start, stop):
+        """
+        Return positions of all hits in range start to stop.
+        """
+        periods = numpy.arange(start // self._modulus,
+                               (stop - 1) // self._modulus + 1,
+                               dtype=numpy.int64)
+        positions = (periods[:, numpy.newaxis] * self._modulus + self._beats).ravel()
+        return positions[(positions >= start) & (positions < stop)]
+
+    def render(self, out):
+        block_end = self._position + len(out)
+
+        for trigger in self._triggers(self._position, block_end):
+            self._mixer.add_track(self._hit, trigger - self._position)
+        self._mixer.render(out)
+
+        self._position = block_end
+        return len(out)
+
+    def skip(self, count):
+        if self._hit_length is None:
+            self._hit_length = self._hit.len(self.samplerate)
+        if self._hit_length == float('inf'):
+            # Every hit since the start would still be playing
+            return super(_RepeatRenderer, self).skip(count)
+
+        target = self._position + count
+        self._mixer.skip(count)
+
+        # Only hits that are still playing at the target are started
+        first = max(self._position, target - self._hit_length)
+        for trigger in self._triggers(first, target):
+            self._mixer.add_renderer(self._hit.renderer(self.samplerate,
+                                                        target - trigger))
+
+        self._position = target
+        return count
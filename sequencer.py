@@ -1,8 +1,8 @@
-from .util import counted_iterator
-from .tracks import BaseTrack
+from .tracks import BaseTrack, Renderer
 from .mixer import Mixer
 import string
 import itertools
+import numpy
 
 class Sequencer(BaseTrack):
     def __init__(self, rhythm, samples, timings, repeat = 1):
@@ -17,25 +17,157 @@ class Sequencer(BaseTrack):
 
         super().__init__()
 
-    def as_iter(self, samplerate):
-        mixer = Mixer(samplerate)
+    def _pattern(self):
+        """
+        Return list of (step, sample) pairs for one repetition,
+        ordered by step.
+        """
+        return [(step, sample)
+                for step, marks in enumerate(self._samples)
+                for sample, mark in marks
+                if sample is not None and mark not in string.whitespace]
 
-        trigger_iterator = self._rhythm.trigger_iterator(samplerate)
-        for i in counted_iterator(self._repeat):
-            for marks in self._samples:
-                while not next(trigger_iterator): # This one is infinite
-                    yield next(mixer)
+    def _events(self, samplerate, first, count):
+        """
+        Return sorted array of sample positions and list of samples
+        triggered at them, for repetitions first to first + count.
+        """
+        pattern = self._pattern()
+        steps = numpy.array([step for step, sample in pattern], dtype=numpy.int64)
+        samples = [sample for step, sample in pattern]
 
-                for sample, mark in marks:
-                    if sample is None:
-                        continue
-                    if mark not in string.whitespace:
-                        mixer.add_track(sample)
+        repetitions = numpy.arange(first, first + count, dtype=numpy.int64)
+        beats = (repetitions[:, numpy.newaxis] * len(self._samples) + steps).ravel()
 
-                yield next(mixer)
+        return self._rhythm.trigger_positions(beats, samplerate), samples * count
 
-        while not mixer.is_empty():
-            yield next(mixer)
+    def _end(self, samplerate):
+        """
+        Return position right after the trigger of the last step,
+        the sequence lasts at least until there.
+        """
+        last_beat = self._repeat * len(self._samples) - 1
+        return int(self._rhythm.trigger_positions(last_beat, samplerate)) + 1
 
-    #def len(self, samplerate):
-    #    beats = max(len(timings) for sample, timings in self._samples)
+    def _renderer(self, samplerate):
+        return _SequencerRenderer(self, samplerate)
+
+    def _parts(self, samplerate, length):
+        if self._repeat is not None:
+            positions, samples = self._events(samplerate, 0, self._repeat)
+            end = self._end(samplerate)
+        elif length is None:
+            return None
+        else:
+            # Enough repetitions to cover the length
+            repetitions = 1
+            while self._rhythm.trigger_positions(
+                    repetitions * len(self._samples), samplerate) < length:
+                repetitions *= 2
+            positions, samples = self._events(samplerate, 0, repetitions)
+            end = 0
+
+        return [(int(position), sample)
+                for position, sample in zip(positions, samples)
+                if length is None or position < length], end
+
+    def len(self, samplerate):
+        if self._repeat is None:
+            return float('inf')
+
+        positions, samples = self._events(samplerate, 0, self._repeat)
+        return max([self._end(samplerate)] +
+                   [position + sample.len(samplerate)
+                    for position, sample in zip(positions, samples)])
+
+
+class _SequencerRenderer(Renderer):
+    """
+    Jumps from event to event, adding samples to the mixer
+    at their offset within the block.
+    """
+
+    def __init__(self, sequencer, samplerate):
+        super(_SequencerRenderer, self).__init__(samplerate)
+        self._sequencer = sequencer
+        self._mixer = Mixer(samplerate)
+        self._position = 0
+
+        if sequencer._repeat is None:
+            # Infinite sequence, events are generated one repetition at a time
+            self._end = float('inf')
+            self._chunk = 1
+        else:
+            self._end = sequencer._end(samplerate)
+            self._chunk = sequencer._repeat
+
+        self._repetition = 0
+        self._positions = numpy.empty(0, dtype=numpy.int64)
+        self._samples = []
+        self._next = 0
+
+    def _has_events(self):
+        if self._next < len(self._positions):
+            return True
+
+        repeat = self._sequencer._repeat
+        if repeat is not None and self._repetition >= repeat:
+            return False
+
+        self._positions, self._samples = self._sequencer._events(
+            self.samplerate, self._repetition, self._chunk)
+        self._repetition += self._chunk
+        self._next = 0
+        # Every repetition has the same events, none now means none ever
+        return len(self._positions) > 0
+
+    def render(self, out):
+        block_end = self._position + len(out)
+
+        while self._has_events():
+            stop = numpy.searchsorted(self._positions, block_end)
+            for i in range(self._next, stop):
+                self._mixer.add_track(self._samples[i],
+                                      self._positions[i] - self._position)
+            self._next = stop
+
+            if stop < len(self._positions):
+                break
+
+        used = self._mixer.render(out)
+        if self._has_events():
+            # Silence between events is still part of the track
+            used = len(out)
+        else:
+            used = max(used, min(self._end - self._position, len(out)))
+
+        self._position = block_end
+        return int(used)
+
+    def skip(self, count):
+        target = self._position + count
+        self._mixer.skip(count)
+
+        # Events before the target are started in the middle,
+        # unless they have already ended.
+        lengths = {}
+        while self._has_events():
+            stop = numpy.searchsorted(self._positions, target)
+            for i in range(self._next, stop):
+                sample = self._samples[i]
+                if id(sample) not in lengths:
+                    lengths[id(sample)] = sample.len(self.samplerate)
+                start = target - self._positions[i]
+                if start < lengths[id(sample)]:
+                    self._mixer.add_renderer(sample.renderer(self.samplerate, start))
+            self._next = stop
+
+            if stop < len(self._positions):
+                break
+
+        skipped = count
+        if self._mixer.is_empty() and not self._has_events():
+            skipped = max(min(self._end - self._position, count), 0)
+
+        self._position = target
+        return skipped
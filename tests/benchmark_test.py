@@ -0,0 +1,29 @@
+import sound_toy
+import sound_toy.benchmark
+import nose.tools
+import json
+
+
+def run_test():
+    results = sound_toy.benchmark.run(samplerate = 1000, length = 1, repeat = 1,
+                                      pattern = 'Sine')
+    names = [result.name for result in results]
+
+    nose.tools.assert_in('SineOscillator/constant', names)
+    nose.tools.assert_not_in('ADSR', names)
+    nose.tools.assert_equals(results[names.index('SineOscillator/constant')].samples, 1000)
+    for result in results:
+        nose.tools.assert_greater(result.realtime_factor, 0)
+        nose.tools.assert_greater(result.peak_memory, 0)
+
+    report = json.loads(json.dumps(sound_toy.benchmark.report(results, length = 1)))
+    nose.tools.assert_equals(len(report['results']), len(results))
+    nose.tools.assert_equals(report['settings'], {'length': 1})
+
+
+def wav_file_test():
+    results = sound_toy.benchmark.run(samplerate = 1000, length = 1, repeat = 1,
+                                      pattern = 'wav_file.open/int16')
+
+    nose.tools.assert_equals([result.name for result in results], ['wav_file.open/int16'])
+    nose.tools.assert_equals(results[0].samples, 1000)
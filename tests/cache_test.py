@@ -0,0 +1,40 @@
+import sound_toy
+import nose.tools
+import numpy
+import tempfile
+
+
+def _note(freq):
+    return sound_toy.oscillators.SineOscillator(
+        freq, amplitude = sound_toy.envelopes.ADSR((0.1, 0.1, 0.1, 0.1)))
+
+
+def structure_key_test():
+    key = sound_toy.cache.structure_key
+
+    nose.tools.assert_equals(key(_note(440)), key(_note(440)))
+    nose.tools.assert_not_equals(key(_note(440)), key(_note(441)))
+
+    with nose.tools.assert_raises(TypeError):
+        key(sound_toy.oscillators.SineOscillator(iter([1, 2, 3])))
+
+
+def render_cache_test():
+    cache = sound_toy.cache.RenderCache(max_bytes = 4000, directory = tempfile.mkdtemp())
+    expected = _note(440).as_array(1000)
+
+    for freq in [440, 440, 441, 440]:
+        values = sound_toy.cache.Cached(_note(freq), cache).as_array(1000)
+
+    numpy.testing.assert_array_equal(values, expected)
+    nose.tools.assert_equals(cache.misses, 2)
+    nose.tools.assert_equals(cache.hits, 2) # The last one is loaded from disk
+    nose.tools.assert_equals(len(cache), 1)
+
+
+def dtype_test():
+    cache = sound_toy.cache.RenderCache(dtype = numpy.float32)
+    data = cache.get(_note(440), 1000)
+
+    nose.tools.assert_equals(data.dtype, numpy.float32)
+    numpy.testing.assert_allclose(data, _note(440).as_array(1000), atol = 1e-6)
@@ -0,0 +1,54 @@
+import sound_toy
+import nose.tools
+import numpy
+import tempfile
+import os
+
+
+class _FakePCM:
+    """ Device returning interleaved periods of the given samples. """
+    def __init__(self, samples, periodsize):
+        self._data = samples.T.astype('<i2').ravel()
+        self._channels = samples.shape[0]
+        self._periodsize = periodsize
+        self.closed = False
+
+    def read(self):
+        size = self._periodsize * self._channels
+        data, self._data = self._data[:size], self._data[size:]
+        return len(data) // self._channels, data.tobytes()
+
+    def close(self):
+        self.closed = True
+
+
+def _samples():
+    return numpy.array([numpy.arange(1000) * 10, -numpy.arange(1000)])
+
+
+def capture_test():
+    pcms = []
+    def open_pcm(samplerate):
+        pcms.append(_FakePCM(_samples(), 64))
+        return pcms[-1], 2
+
+    track = sound_toy.capture.Capture(open_pcm, channel = 1, length = 0.9)
+    values = track.as_array(1000)
+
+    numpy.testing.assert_allclose(values, -numpy.arange(900) / (2**15 - 1))
+    nose.tools.assert_true(pcms[-1].closed)
+
+    blocks = list(track.as_arrays_iter(1000, 100, zfill = False))
+    numpy.testing.assert_array_equal(numpy.concatenate(blocks), values)
+
+
+def record_test():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "recording.npy")
+        left, right = sound_toy.capture.record(
+            _FakePCM(_samples(), 64), 2, 1000, 0.5,
+            remove_dc_offset = False, dtype = numpy.float32, filename = filename)
+
+        numpy.testing.assert_allclose(left.as_array(1000, dtype = numpy.float32),
+                                      numpy.arange(500) * 10 / (2**15 - 1))
+        numpy.testing.assert_array_equal(numpy.load(filename)[1], right.as_array(1000))
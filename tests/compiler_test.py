@@ -0,0 +1,61 @@
+import sound_toy
+import sound_toy.effects
+import nose.tools
+import numpy
+
+
+def _patch():
+    oscillators = sound_toy.oscillators
+    envelopes = sound_toy.envelopes
+
+    lfo = oscillators.SineOscillator(
+        3, amplitude = envelopes.ADSR((0.2, 0.2, 0.2, 0.2), 2, 4))
+    freq = oscillators.SineOscillator(
+        0.5, amplitudeLow = 200,
+        amplitudeHigh = envelopes.PiecewiseLinear([(0, 300), (3, 300)]))
+    tone = oscillators.TriangleOscillator(
+        freq, phase = lfo, amplitude = envelopes.ADSR((0.1, 0.1, 0.2, 0.1)))
+
+    return sound_toy.effects.Echo(tone, 0.1, 0.5)
+
+
+def plan_test():
+    plan = sound_toy.compiler.compile_track(_patch(), 1000, blocksize = 64)
+
+    # Constant PiecewiseLinear is folded, second ADSR reuses the first one's buffer
+    nose.tools.assert_equals(len(plan.describe()), 6)
+    nose.tools.assert_equals(plan.buffer_count, 4)
+
+    expected = _patch().as_array(1000)
+    compiled = sound_toy.compiler.Compiled(_patch(), blocksize = 64)
+    numpy.testing.assert_allclose(compiled.as_array(1000), expected)
+
+    blocks = numpy.concatenate(list(compiled.as_arrays_iter(1000, 100, zfill = False)))
+    numpy.testing.assert_allclose(blocks, expected)
+
+
+def fold_test():
+    envelope = sound_toy.envelopes.PiecewiseLinear([(0, 2), (1, 2)])
+    oscillator = sound_toy.oscillators.SineOscillator(10, amplitude = envelope)
+
+    folded = sound_toy.compiler.fold(oscillator)
+
+    nose.tools.assert_is_instance(folded._amplitude, sound_toy.envelopes.Box)
+    nose.tools.assert_is(oscillator._amplitude, envelope)
+    numpy.testing.assert_allclose(folded.as_array(100), oscillator.as_array(100))
+
+
+def float32_test():
+    plan = sound_toy.compiler.compile_track(_patch(), 1000, blocksize = 64,
+                                            dtype = numpy.float32)
+
+    # Frequency and phase of the tone are kept in double precision
+    outputs = [line.split("-> ")[1] for line in plan.describe()]
+    nose.tools.assert_equals(sum(output.startswith("float64") for output in outputs), 2)
+    nose.tools.assert_equals(plan.buffer_count, 4)
+
+    expected = _patch().as_array(1000, dtype = numpy.float32)
+    compiled = sound_toy.compiler.Compiled(_patch(), blocksize = 64, dtype = numpy.float32)
+    values = compiled.as_array(1000, dtype = numpy.float32)
+    nose.tools.assert_equals(values.dtype, numpy.float32)
+    numpy.testing.assert_allclose(values, expected, atol = 1e-6)
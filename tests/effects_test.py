@@ -0,0 +1,37 @@
+import sound_toy
+import sound_toy.effects
+import nose.tools
+import numpy
+
+
+def echo_test():
+    impulse = sound_toy.tracks.NumpyTrack(numpy.array([1.0]), 100)
+    echo = sound_toy.effects.Echo(impulse, 0.1, 0.5, 0.01)
+
+    values = echo.as_array(100)
+    nose.tools.assert_equals(len(values), echo.len(100))
+
+    expected = numpy.zeros(len(values))
+    expected[::10] = 0.5 ** numpy.arange(8)
+    numpy.testing.assert_allclose(values, expected)
+
+    blocks = numpy.concatenate(list(echo.as_arrays_iter(100, 3, zfill = False)))
+    numpy.testing.assert_allclose(blocks, values)
+
+
+def fractional_echo_test():
+    impulse = sound_toy.tracks.NumpyTrack(numpy.array([1.0]), 100)
+    values = sound_toy.effects.Echo(impulse, 0.105, 0.5).as_array(100)
+
+    numpy.testing.assert_allclose(values[10:12], [0.25, 0.25])
+
+
+def echo_seek_test():
+    impulses = numpy.zeros(1000)
+    impulses[::100] = 1
+    echo = sound_toy.effects.Echo(sound_toy.tracks.NumpyTrack(impulses, 100), 0.1, 0.5, 0.01)
+    values = echo.as_array(100)
+
+    # Echoes from before the warm-up window are lost, but they are
+    # below the noise floor
+    numpy.testing.assert_allclose(echo.as_array(100, 500), values[500:], atol = 0.01)
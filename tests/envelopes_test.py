@@ -1,5 +1,6 @@
 import sound_toy
 import nose.tools
+import numpy
 
 def interpolate_test():
     pass
@@ -20,3 +21,26 @@ def box_test():
 
     with nose.tools.assert_raises(StopIteration):
         next(it)
+
+
+def piecewise_linear_ranges_test():
+    envelope = sound_toy.envelopes.PiecewiseLinear(
+        [(0.1, 1), (0.5, 3), (0.5, 7), (2, 0)])
+    renderer = envelope.renderer(100)
+    points, xs = renderer._params
+
+    # Generic segment by segment path must agree with numpy.interp
+    for start, count in [(0, 200), (5, 10), (45, 20), (190, 10)]:
+        generic = numpy.empty(count)
+        sound_toy.envelopes.Interpolate._fill(envelope, (points, xs), start, generic)
+        fast = numpy.empty(count)
+        envelope._fill((points, xs), start, fast)
+        numpy.testing.assert_allclose(generic, fast)
+
+
+def exponential_test():
+    values = sound_toy.envelopes.Exponential(1, 0.01, 1).as_array(100)
+
+    nose.tools.assert_equals(len(values), 100)
+    nose.tools.assert_almost_equals(values[0], 1)
+    nose.tools.assert_almost_equals(values[50], 0.1)
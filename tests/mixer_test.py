@@ -0,0 +1,18 @@
+import sound_toy
+import nose.tools
+import numpy
+
+
+def offsets_test():
+    mixer = sound_toy.mixer.Mixer(100)
+    mixer.add_track(sound_toy.envelopes.Box(0.05, 1), 3)
+    mixer.add_track(sound_toy.envelopes.Box(0.05, 2), 12)
+
+    out = numpy.empty(10)
+    nose.tools.assert_equals(mixer.render(out), 10)
+    numpy.testing.assert_array_equal(out, [0, 0, 0, 1, 1, 1, 1, 1, 0, 0])
+
+    nose.tools.assert_false(mixer.is_empty())
+    nose.tools.assert_equals(mixer.render(out), 7)
+    numpy.testing.assert_array_equal(out, [0, 0, 2, 2, 2, 2, 2, 0, 0, 0])
+    nose.tools.assert_true(mixer.is_empty())
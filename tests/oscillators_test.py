@@ -0,0 +1,58 @@
+import sound_toy
+import nose.tools
+import numpy
+
+
+def block_size_independence_test():
+    osc = sound_toy.oscillators.TriangleOscillator(
+        sound_toy.envelopes.PiecewiseLinear([(0, 1), (1, 20), (2, 5)]),
+        phase = sound_toy.oscillators.SineOscillator(3, amplitude = 0.5))
+
+    expected = osc.as_array(1000)
+    blocks = numpy.concatenate(list(osc.as_arrays_iter(1000, 37, zfill = False)))
+
+    numpy.testing.assert_allclose(blocks, expected, atol = 1e-9)
+
+
+def square_test():
+    osc = sound_toy.oscillators.SquareOscillator(
+        10, amplitude = sound_toy.envelopes.Box(1))
+    values = osc.as_array(1000)
+
+    numpy.testing.assert_array_equal(values[:50], 1)
+    numpy.testing.assert_array_equal(values[50:100], -1)
+
+
+def amplitude_low_high_test():
+    osc = sound_toy.oscillators.SineOscillator(
+        10, amplitudeLow = 2, amplitudeHigh = sound_toy.envelopes.Box(1, 4))
+    values = osc.as_array(1000)
+
+    nose.tools.assert_equals(len(values), 1000)
+    nose.tools.assert_almost_equals(values.max(), 4)
+    nose.tools.assert_almost_equals(values.min(), 2)
+
+
+def wavetable_test():
+    naive = sound_toy.oscillators.TriangleOscillator(
+        50, amplitude = sound_toy.envelopes.Box(0.1))
+    wavetable = sound_toy.oscillators.WavetableOscillator(
+        50, waveform = sound_toy.oscillators.TriangleOscillator,
+        amplitude = sound_toy.envelopes.Box(0.1))
+
+    numpy.testing.assert_allclose(
+        wavetable.as_array(44100), naive.as_array(44100), atol = 1e-2)
+
+    # Tables are shared
+    nose.tools.assert_is(
+        sound_toy.oscillators._mipmap(sound_toy.oscillators.TriangleOscillator, 2048),
+        sound_toy.oscillators._mipmap(sound_toy.oscillators.TriangleOscillator, 2048))
+
+
+def seek_test():
+    freq = sound_toy.envelopes.PiecewiseLinear([(0, 100), (1, 400)])
+    for osc in [sound_toy.oscillators.SineOscillator(440, amplitude = sound_toy.envelopes.Box(1)),
+                sound_toy.oscillators.SquareOscillator(freq)]:
+        values = osc.as_array(8000)
+        numpy.testing.assert_array_equal(osc.as_array(8000, 1234, 5000), values[1234:5000])
+        numpy.testing.assert_array_equal(osc.as_array(8000, 7990, 9000), values[7990:])
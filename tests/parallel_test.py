@@ -0,0 +1,71 @@
+import sound_toy
+import nose.tools
+import numpy
+import itertools
+
+
+def _note(i):
+    freq = sound_toy.oscillators.SineOscillator(3, amplitudeLow = 300 + 10 * i,
+                                                amplitudeHigh = 310 + 10 * i)
+    return sound_toy.oscillators.SineOscillator(
+        freq, amplitude = sound_toy.envelopes.ADSR((0.01, 0.05, 0.1, 0.1)))
+
+
+def sequencer_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 240)
+    sequencer = sound_toy.sequencer.Sequencer(
+        rhythm, (_note(i) for i in itertools.count()),
+        ["X X X X", " X   X", "X  X"], repeat = 2)
+
+    expected = sequencer.as_array(8000)
+    values = sound_toy.parallel.render(sequencer, 8000, processes = 2)
+
+    numpy.testing.assert_array_equal(values, expected)
+
+
+def mix_test():
+    rhythm = sound_toy.rhythm.Rhythm(2, 300)
+    mix = sound_toy.mixer.Mix(
+        sound_toy.rhythm.Repeat(_note(0), rhythm, {0, 0.5}),
+        sound_toy.rhythm.Repeat(_note(1), rhythm, {1}))
+
+    expected = mix.renderer(8000).render_block(20000)
+    values = sound_toy.parallel.render(mix, 8000, length = 20000, processes = 2)
+
+    numpy.testing.assert_array_equal(values, expected)
+
+
+def unique_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    repeat = sound_toy.rhythm.Repeat(_note(0), rhythm, {0, 1, 2, 3})
+
+    parts, end = repeat._parts(8000, 40000)
+    jobs, indices = sound_toy.parallel._unique(parts, 8000, 40000)
+    nose.tools.assert_greater(len(parts), 40)
+    # Only hits cut by the end of the rendered range are rendered separately
+    hit = _note(0).len(8000)
+    cut = sum(1 for offset, part in parts if offset > 40000 - hit)
+    nose.tools.assert_equals(len(jobs), 1 + cut)
+
+    expected = repeat.renderer(8000).render_block(40000)
+    values = sound_toy.parallel.render(repeat, 8000, length = 40000, processes = 2)
+    numpy.testing.assert_array_equal(values, expected)
+
+
+@nose.tools.raises(Exception)
+def infinite_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    sound_toy.parallel.render(sound_toy.rhythm.Repeat(_note(0), rhythm, {0}), 8000)
+
+
+def segments_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 240)
+    sequencer = sound_toy.sequencer.Sequencer(
+        rhythm, (_note(i) for i in itertools.count()),
+        ["X X X X", " X   X", "X  X"], repeat = 2)
+
+    expected = sequencer.as_array(8000)
+    values = sound_toy.parallel.render_segments(sequencer, 8000, segment = 3000,
+                                                processes = 2)
+
+    numpy.testing.assert_array_equal(values, expected)
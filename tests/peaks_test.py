@@ -0,0 +1,39 @@
+import sound_toy
+import nose.tools
+import numpy
+
+
+def _track(data, samplerate = 1000):
+    return sound_toy.tracks.NumpyTrack(numpy.asarray(data, dtype = numpy.float64), samplerate)
+
+
+def levels_test():
+    data = numpy.sin(numpy.arange(10000) * 0.01) * numpy.linspace(0, 1, 10000)
+    pyramid = sound_toy.peaks.summarize(_track(data), 1000, bin_size = 16, factor = 4,
+                                        blocksize = 100)
+
+    nose.tools.assert_equals(pyramid.length, len(data))
+    for level in pyramid.levels:
+        starts = numpy.arange(0, len(data), level.bin_size)
+        numpy.testing.assert_allclose(level.min, numpy.minimum.reduceat(data, starts))
+        numpy.testing.assert_allclose(level.max, numpy.maximum.reduceat(data, starts))
+        counts = numpy.diff(numpy.append(starts, len(data)))
+        numpy.testing.assert_allclose(level.rms,
+                                      numpy.sqrt(numpy.add.reduceat(data * data, starts) / counts))
+    nose.tools.assert_equals(len(pyramid.levels[-1].min), 1)
+
+
+def window_test():
+    osc = sound_toy.oscillators.SineOscillator(10)
+    pyramid = sound_toy.peaks.summarize(osc, 1000, start = 1, end = 3, bin_size = 10)
+
+    nose.tools.assert_equals(pyramid.start, 1000)
+    nose.tools.assert_equals(pyramid.length, 2000)
+    level = pyramid.level(200)
+    nose.tools.assert_equals(len(level.min), 200)
+    numpy.testing.assert_allclose(pyramid.times(level)[[0, -1]], [1.005, 2.995])
+
+
+@nose.tools.raises(Exception)
+def infinite_test():
+    sound_toy.peaks.summarize(sound_toy.oscillators.SineOscillator(10), 1000)
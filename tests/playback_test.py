@@ -0,0 +1,75 @@
+import sound_toy
+import nose.tools
+import numpy
+import time
+
+
+class _FakePCM:
+    """ Device that plays in real time. """
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self.periods = []
+
+    def write(self, data):
+        period = numpy.frombuffer(data, numpy.float32).copy()
+        self.periods.append(period)
+        time.sleep(len(period) / self.samplerate)
+        return len(period)
+
+
+class _SlowTrack(sound_toy.tracks.BaseTrack):
+    """ Renders blocks of ones, sleeping before each. """
+    def __init__(self, length, delay):
+        super().__init__()
+        self._length = length
+        self._delay = delay
+
+    def as_iter(self, samplerate):
+        for i in range(self._length):
+            if i % 100 == 0:
+                time.sleep(self._delay)
+            yield 1
+
+
+def ring_buffer_test():
+    ring = sound_toy.playback.RingBuffer(10)
+    out = numpy.empty(10, numpy.float32)
+
+    nose.tools.assert_equals(ring.write(numpy.arange(7)), 7)
+    nose.tools.assert_equals(ring.read(out[:5]), 5)
+    nose.tools.assert_equals(ring.write(numpy.arange(7, 20)), 8) # wraps around
+    nose.tools.assert_equals(ring.fill(), 10)
+    nose.tools.assert_equals(ring.read(out), 10)
+    numpy.testing.assert_array_equal(out, numpy.arange(5, 15))
+
+
+def play_test():
+    track = sound_toy.oscillators.SineOscillator(
+        440, amplitude = sound_toy.envelopes.Box(0.5, 2))
+    pcm = _FakePCM(8000)
+    player = sound_toy.playback.Player(track, pcm, 8000, periodsize = 64,
+                                       blocksize = 1000, depth = 2000)
+    stats = player.run()
+
+    values = numpy.concatenate(pcm.periods)
+    # The last period is zero padded
+    nose.tools.assert_true(all(len(period) == 64 for period in pcm.periods))
+    nose.tools.assert_equals(len(values), 4032)
+    numpy.testing.assert_allclose(values[:4000], numpy.clip(track.as_array(8000), -1, 1),
+                                  atol = 1e-6)
+    numpy.testing.assert_array_equal(values[4000:], 0)
+    nose.tools.assert_equals(stats.frames, 4000)
+    nose.tools.assert_equals(stats.xruns, 0)
+    nose.tools.assert_equals(stats.max_latency, (2000 + 64) / 8000)
+
+
+def underrun_test():
+    pcm = _FakePCM(80000)
+    player = sound_toy.playback.Player(_SlowTrack(1000, 0.01), pcm, 8000,
+                                       periodsize = 100, blocksize = 100,
+                                       depth = 100)
+    stats = player.run()
+
+    nose.tools.assert_equals(stats.frames, 1000)
+    nose.tools.assert_greater(stats.xruns, 0)
+    nose.tools.assert_equals(stats.min_fill, 0)
@@ -0,0 +1,63 @@
+import sound_toy
+import sound_toy.effects
+import nose.tools
+import json
+import numpy
+
+
+def _track():
+    envelope = sound_toy.envelopes.ADSR((0.1, 0.1, 0.5, 0.3))
+    osc = sound_toy.oscillators.SineOscillator(
+        sound_toy.oscillators.SineOscillator(5, amplitudeLow = 90, amplitudeHigh = 110),
+        amplitude = envelope)
+    return sound_toy.effects.Echo(osc, 0.1, 0.5)
+
+
+def tree_test():
+    track = _track()
+    expected = track.as_array(1000)
+    renderer = sound_toy.tracks.BaseTrack.renderer
+
+    with sound_toy.profiler.Profiler(memory = True) as profiler:
+        values = track.as_array(1000)
+
+    nose.tools.assert_is(sound_toy.tracks.BaseTrack.renderer, renderer)
+    numpy.testing.assert_array_equal(values, expected)
+
+    report = json.loads(profiler.to_json())
+    nose.tools.assert_equals(len(report), 1)
+    echo = report[0]
+    nose.tools.assert_equals(echo['name'], 'Echo')
+    nose.tools.assert_equals(echo['renderers'], 1)
+    nose.tools.assert_equals(echo['samples'], len(values))
+    nose.tools.assert_greater(echo['calls'], 0)
+    nose.tools.assert_greater(echo['allocated'], 0)
+
+    osc, = echo['children']
+    nose.tools.assert_equals(osc['name'], 'SineOscillator')
+    nose.tools.assert_equals([child['name'] for child in osc['children']],
+                             ['SineOscillator', 'ADSR'])
+    nose.tools.assert_equals(osc['children'][1]['samples'], 1000)
+    nose.tools.assert_almost_equals(
+        echo['time'], echo['self_time'] + osc['time'], places = 9)
+
+
+def compiled_test():
+    track = sound_toy.compiler.Compiled(_track())
+    with sound_toy.profiler.Profiler() as profiler:
+        values = track.as_array(1000)
+
+    compiled, = profiler.report()
+    nose.tools.assert_not_in('allocated', compiled)
+    echo, = compiled['children']
+    nose.tools.assert_equals(echo['name'], 'Echo')
+    nose.tools.assert_equals(echo['samples'], len(values))
+    nose.tools.assert_equals([child['name'] for child in echo['children'][0]['children']],
+                             ['SineOscillator', 'ADSR'])
+
+
+@nose.tools.raises(Exception)
+def nested_test():
+    with sound_toy.profiler.Profiler():
+        with sound_toy.profiler.Profiler():
+            pass
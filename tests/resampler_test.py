@@ -0,0 +1,48 @@
+import sound_toy
+import nose.tools
+import numpy
+
+
+def _sine(freq, samplerate, length = 1):
+    osc = sound_toy.oscillators.SineOscillator(
+        freq, amplitude = sound_toy.envelopes.Box(length))
+    return sound_toy.tracks.NumpyTrack(osc.as_array(samplerate), samplerate)
+
+
+def sinc_test():
+    resampler = sound_toy.resampler.Resampler(_sine(1000, 48000))
+
+    for samplerate in [44100, 96000]:
+        values = resampler.as_array(samplerate)
+        nose.tools.assert_equals(len(values), samplerate)
+        nose.tools.assert_equals(resampler.len(samplerate), samplerate)
+
+        expected = numpy.sin(numpy.arange(samplerate) * 2 * numpy.pi * 1000 / samplerate)
+        numpy.testing.assert_allclose(values[100:-100], expected[100:-100], atol = 1e-4)
+
+
+def linear_test():
+    resampler = sound_toy.resampler.Resampler(_sine(100, 1000), mode = 'linear')
+    values = resampler.as_array(3000)
+
+    numpy.testing.assert_allclose(values[::3], resampler._slaves[0].as_array(1000))
+    numpy.testing.assert_allclose(values[1:-3:3], 2 / 3 * values[:-3:3] + 1 / 3 * values[3::3])
+
+
+def anti_aliasing_test():
+    # Above the Nyquist frequency of the output
+    values = sound_toy.resampler.Resampler(_sine(15000, 48000)).as_array(22050)
+    nose.tools.assert_less(numpy.abs(values[100:-100]).max(), 1e-3)
+
+
+def blocks_test():
+    resampler = sound_toy.resampler.Resampler(_sine(440, 48000, 0.1))
+    values = resampler.as_array(44100)
+
+    blocks = numpy.concatenate(list(resampler.as_arrays_iter(44100, 77, zfill = False)))
+    numpy.testing.assert_array_equal(blocks, values)
+    numpy.testing.assert_array_equal(resampler.as_array(44100, 1234), values[1234:])
+
+    # Filter banks are shared
+    nose.tools.assert_is(sound_toy.resampler._filter_bank('sinc', 147, 160, 16),
+                         sound_toy.resampler._filter_bank('sinc', 147, 160, 16))
@@ -0,0 +1,34 @@
+import sound_toy
+import numpy
+import itertools
+
+
+def _render(track, samplerate, blocks):
+    return numpy.concatenate(list(itertools.islice(
+        track.as_arrays_iter(samplerate, 1000), blocks)))
+
+
+def repeat_test():
+    rhythm = sound_toy.rhythm.Rhythm(2, 600)
+    ping = sound_toy.oscillators.SquareOscillator(
+        freq = 250,
+        amplitude = sound_toy.envelopes.ADSR((0.01, 0.01, 0.01, 0.02)))
+
+    cached = _render(sound_toy.rhythm.Repeat(ping, rhythm, {0, 0.75, 1}), 1000, 4)
+    uncached = _render(
+        sound_toy.rhythm.Repeat(ping, rhythm, {0, 0.75, 1}, cache_hit = False), 1000, 4)
+
+    numpy.testing.assert_allclose(cached, uncached)
+
+    hit = ping.as_array(1000)
+    for start in [0, 200, 400]:
+        numpy.testing.assert_allclose(cached[start:start + len(hit)], hit)
+
+
+def trigger_positions_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 123)
+    it = rhythm.trigger_iterator(1000)
+    expected = [i for i, trigger in enumerate(itertools.islice(it, 10000)) if trigger]
+
+    numpy.testing.assert_array_equal(
+        rhythm.trigger_positions(numpy.arange(len(expected)), 1000), expected)
@@ -0,0 +1,69 @@
+import sound_toy
+import nose.tools
+import numpy
+
+
+def len_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    ping = sound_toy.envelopes.Box(0.05, 1)
+    sequencer = sound_toy.sequencer.Sequencer(
+        rhythm, [ping, ping], ["X X", " X  "], repeat = 2)
+
+    values = sequencer.as_array(1000)
+
+    nose.tools.assert_equals(len(values), sequencer.len(1000))
+    # Two repetitions of four steps, the last one is a rest
+    nose.tools.assert_equals(len(values), 7 * 100 + 1)
+    numpy.testing.assert_array_equal(
+        numpy.flatnonzero(numpy.diff(values)) + 1,
+        [50, 100, 150, 200, 250, 400, 450, 500, 550, 600, 650])
+
+
+def seek_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    ping = sound_toy.oscillators.SineOscillator(
+        100, amplitude = sound_toy.envelopes.Box(0.15))
+    sequencer = sound_toy.sequencer.Sequencer(
+        rhythm, [ping, ping], ["X X", " X  "], repeat = 2)
+
+    values = sequencer.as_array(1000)
+
+    # Starting in the middle of a ping
+    numpy.testing.assert_array_equal(sequencer.as_array(1000, 120), values[120:])
+    numpy.testing.assert_array_equal(sequencer.as_array(1000, 420, 500), values[420:500])
+
+
+def sparse_test():
+    # Gaps between the pings are longer than a block
+    rhythm = sound_toy.rhythm.Rhythm(4, 60)
+    ping = sound_toy.oscillators.SineOscillator(
+        440, amplitude = sound_toy.envelopes.Box(0.1))
+    sequencer = sound_toy.sequencer.Sequencer(rhythm, [ping], ["X X"])
+
+    values = sequencer.as_array(8000)
+    nose.tools.assert_equals(len(values), sequencer.len(8000))
+    nose.tools.assert_equals(len(values), 16800)
+    nose.tools.assert_true(numpy.any(values[16000:16800]))
+
+    renderer = sequencer.renderer(8000)
+    count = renderer.render(numpy.empty(1000))
+    nose.tools.assert_equals(count, 1000)
+    nose.tools.assert_is(type(count), int)
+
+    infinite = sound_toy.sequencer.Sequencer(rhythm, [ping], ["X X"], repeat = None)
+    blocks = infinite.as_arrays_iter(8000, 1000)
+    numpy.testing.assert_array_equal(
+        numpy.concatenate([next(blocks) for i in range(17)])[:16800], values)
+
+
+def empty_test():
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    ping = sound_toy.envelopes.Box(0.05, 1)
+    sequencer = sound_toy.sequencer.Sequencer(rhythm, [ping], ["    "], repeat = None)
+
+    renderer = sequencer.renderer(1000)
+    out = numpy.ones(1000)
+    nose.tools.assert_equals(renderer.render(out), 1000)
+    numpy.testing.assert_array_equal(out, 0)
+    nose.tools.assert_equals(renderer.skip(5000), 5000)
+    nose.tools.assert_equals(renderer.render(out), 1000)
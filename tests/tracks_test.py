@@ -0,0 +1,143 @@
+import sound_toy
+import nose.tools
+import numpy
+import concurrent.futures
+
+
+def as_arrays_iter_test():
+    adsr = sound_toy.envelopes.ADSR((0.1, 0.1, 0.1, 0.1))
+    expected = numpy.array(list(adsr.as_iter(100)))
+
+    nose.tools.assert_equals(len(expected), 40)
+
+    blocks = list(adsr.as_arrays_iter(100, 15, zfill = False))
+    nose.tools.assert_equals([len(block) for block in blocks], [15, 15, 10])
+    numpy.testing.assert_array_equal(numpy.concatenate(blocks), expected)
+
+    blocks = list(adsr.as_arrays_iter(100, 15))
+    nose.tools.assert_equals(len(blocks[-1]), 15)
+    numpy.testing.assert_array_equal(blocks[-1][10:], 0)
+
+
+def renderer_test():
+    osc = sound_toy.oscillators.SineOscillator(
+        5, amplitude = sound_toy.envelopes.Box(1))
+
+    renderer = osc.renderer(1000)
+    out = numpy.full(600, 100.0)
+
+    nose.tools.assert_equals(renderer.render(out), 600)
+    previous = out.copy()
+    nose.tools.assert_equals(renderer.render(out), 400)
+    numpy.testing.assert_array_equal(out[400:], previous[400:]) # left untouched
+    nose.tools.assert_equals(renderer.render(out), 0)
+
+    numpy.testing.assert_allclose(
+        osc.as_array(1000),
+        numpy.sin(numpy.arange(1000) * 2 * numpy.pi * 5 / 1000), atol = 1e-9)
+
+
+def concurrent_render_test():
+    # Shared instances, as returned by memoized instruments
+    freq = sound_toy.oscillators.SineOscillator(
+        5, amplitudeLow = 300, amplitudeHigh = 500)
+    note = sound_toy.oscillators.WavetableOscillator(
+        freq, amplitude = sound_toy.envelopes.ADSR((0.01, 0.02, 0.5, 0.1)))
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    sequencer = sound_toy.sequencer.Sequencer(
+        rhythm, [note, note], ["X XX", " X X"], repeat = 3)
+
+    expected = sequencer.as_array(8000)
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda start: sequencer.as_array(8000, start),
+                                    [0, 0, 100, 0, 1000, 0, 0, 3]))
+
+    for start, values in zip([0, 0, 100, 0, 1000, 0, 0, 3], results):
+        numpy.testing.assert_array_equal(values, expected[start:])
+
+
+def chain_test():
+    chain = sound_toy.tracks.Chain(
+        sound_toy.envelopes.Box(0.2, 3),
+        sound_toy.envelopes.Box(0.1, 2))
+
+    numpy.testing.assert_array_equal(chain.as_array(100), [3] * 20 + [2] * 10)
+    numpy.testing.assert_array_equal(chain.as_array(100, 15, 25), [3] * 5 + [2] * 5)
+
+
+def control_rate_test():
+    envelope = sound_toy.envelopes.PiecewiseLinear([(0, 0), (1, 1)])
+    control = envelope.control_rate(10)
+
+    values = control.as_array(1000)
+    nose.tools.assert_equals(len(values), control.len(1000))
+    # Linear envelope survives linear interpolation
+    numpy.testing.assert_allclose(values[:990], envelope.as_array(1000)[:990])
+
+    blocks = numpy.concatenate(list(control.as_arrays_iter(1000, 7, zfill = False)))
+    numpy.testing.assert_allclose(blocks, values)
+
+    numpy.testing.assert_allclose(control.as_array(1000, 333), values[333:])
+
+
+def control_rate_end_test():
+    envelope = sound_toy.envelopes.ADSR((0.1, 0.1, 0.3, 0.2))
+    control = envelope.control_rate(32)
+    expected = envelope.as_array(1000)
+
+    values = control.as_array(1000)
+    nose.tools.assert_equals(len(values), 700)
+    nose.tools.assert_equals(control.len(1000), 700)
+    # The last partial period continues towards the end instead of holding
+    nose.tools.assert_less(abs(values[-1] - expected[-1]), 0.02)
+    nose.tools.assert_true(numpy.all(numpy.diff(values[-40:]) < 0))
+    numpy.testing.assert_allclose(values[:-40], expected[:-40], atol = 0.05)
+
+    for size in [7, 50]:
+        blocks = numpy.concatenate(list(control.as_arrays_iter(1000, size, zfill = False)))
+        numpy.testing.assert_allclose(blocks, values)
+    for start in [100, 576, 600, 608, 640, 672, 680, 699]:
+        numpy.testing.assert_allclose(control.as_array(1000, start), values[start:])
+
+
+class _CountingRamp(sound_toy.tracks.BaseTrack):
+    def __init__(self, length):
+        super(_CountingRamp, self).__init__()
+        self._length = length
+        self.rendered = 0
+
+    def as_iter(self, samplerate):
+        for i in range(self.len(samplerate)):
+            self.rendered += 1
+            yield i / samplerate
+
+    def len(self, samplerate):
+        return int(self._length * samplerate)
+
+
+def control_rate_slave_test():
+    ramp = _CountingRamp(10)
+    values = ramp.control_rate(64).as_array(6400)
+
+    # The slave is only rendered at the control rate
+    nose.tools.assert_equals(ramp.rendered, 1000)
+    nose.tools.assert_equals(len(values), 64000)
+    numpy.testing.assert_allclose(values, numpy.arange(64000) / 6400)
+
+
+def dtype_test():
+    osc = sound_toy.oscillators.SineOscillator(
+        sound_toy.envelopes.PiecewiseLinear([(0, 100), (1, 300)]),
+        amplitude = sound_toy.envelopes.ADSR((0.1, 0.1, 0.5, 0.3)))
+    rhythm = sound_toy.rhythm.Rhythm(4, 600)
+    sequencer = sound_toy.sequencer.Sequencer(rhythm, [osc], ["X X"])
+
+    expected = sequencer.as_array(8000)
+    values = sequencer.as_array(8000, dtype = numpy.float32)
+
+    nose.tools.assert_equals(values.dtype, numpy.float32)
+    numpy.testing.assert_allclose(values, expected, atol = 1e-6)
+
+    blocks = list(sequencer.as_arrays_iter(8000, 1000, dtype = numpy.float32))
+    nose.tools.assert_equals(blocks[0].dtype, numpy.float32)
@@ -0,0 +1,44 @@
+import sound_toy
+import nose.tools
+
+
+def memoize_test():
+    calls = []
+
+    @sound_toy.util.memoize(maxsize = 2)
+    def f(x, y = 0):
+        calls.append(x)
+        return x + y
+
+    nose.tools.assert_equals(f(1), 1)
+    nose.tools.assert_equals(f(1), 1)
+    nose.tools.assert_equals(f(2, y = 1), 3)
+    nose.tools.assert_equals(f(3), 3) # Evicts 1
+    nose.tools.assert_equals(f(1), 1)
+    nose.tools.assert_equals(calls, [1, 2, 3, 1])
+
+    f.invalidate(1)
+    f(1)
+    nose.tools.assert_equals(calls, [1, 2, 3, 1, 1])
+
+    nose.tools.assert_equals(f([1], y = [2]), [1, 2]) # Unhashable
+
+    info = f.info()
+    nose.tools.assert_equals(info.hits, 1)
+    nose.tools.assert_equals(info.misses, 5)
+    nose.tools.assert_equals(info.evictions, 2)
+    nose.tools.assert_equals(info.uncacheable, 1)
+    nose.tools.assert_equals(info.size, 2)
+
+
+def weak_memoize_test():
+    class Value:
+        pass
+
+    f = sound_toy.util.Memoize(lambda x: Value(), weak = True)
+
+    value = f(1)
+    nose.tools.assert_is(f(1), value)
+    del value
+    f(1)
+    nose.tools.assert_equals(f.info().misses, 2)
@@ -0,0 +1,92 @@
+import sound_toy
+import nose.tools
+import numpy
+import struct
+import tempfile
+import os
+
+
+def _write_wav(filename, data, format, bits, samplerate = 1000):
+    """ Write interleaved bytes of data (frames x channels) into a wave file. """
+    raw = data.tobytes()
+    channels = len(raw) * 8 // bits // len(data)
+    block_align = channels * bits // 8
+    with open(filename, 'wb') as f:
+        f.write(struct.pack('<4sI4s', b'RIFF', 36 + 12 + len(raw), b'WAVE'))
+        f.write(struct.pack('<4sIHHIIHH', b'fmt ', 16, format, channels, samplerate,
+                            samplerate * block_align, block_align, bits))
+        f.write(struct.pack('<4sI', b'LIST', 4) + b'INFO') # Skipped chunk
+        f.write(struct.pack('<4sI', b'data', len(raw)))
+        f.write(raw)
+
+
+def _check(data, format, bits, expected):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "test.wav")
+        _write_wav(filename, data, format, bits)
+
+        tracks = sound_toy.wav_file.open(filename)
+        nose.tools.assert_equals(len(tracks), len(expected))
+        for track, values in zip(tracks, expected):
+            nose.tools.assert_equals(track.len(1000), len(values))
+            numpy.testing.assert_allclose(track.as_array(1000), values, atol = 1e-9)
+            numpy.testing.assert_allclose(track.as_array(1000, 1, 3), values[1:3], atol = 1e-9)
+
+
+def int16_test():
+    data = numpy.array([[0, 32767], [-32767, 16384], [100, -100]], '<i2')
+    _check(data, 1, 16, data.T / 32767)
+
+
+def uint8_test():
+    data = numpy.array([[128], [255], [1], [192]], 'u1')
+    _check(data, 1, 8, [[0, 1, -1, 64 / 127]])
+
+
+def int24_test():
+    values = numpy.array([0, 2**23 - 1, -(2**23 - 1), -2, 12345])
+    data = (values[:, numpy.newaxis] >> numpy.array([0, 8, 16])) & 0xff
+    _check(data.astype('u1'), 1, 24, [values / (2**23 - 1)])
+
+
+def float32_test():
+    data = numpy.array([[0.5, -0.25], [1, 0.125]], '<f4')
+    _check(data, 3, 32, data.T)
+
+
+def samplerate_test():
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "test.wav")
+        _write_wav(filename, numpy.zeros((10, 1), '<i2'), 1, 16, 44100)
+
+        track = sound_toy.wav_file.WavFileTrack(filename)
+        nose.tools.assert_equals(track.samplerate, 44100)
+        nose.tools.assert_raises(Exception, track.as_array, 1000)
+
+
+def save_test():
+    left = sound_toy.oscillators.SineOscillator(
+        50, amplitude = sound_toy.envelopes.Box(0.3, 0.9))
+    right = sound_toy.envelopes.PiecewiseLinear([(0, -1.5), (0.2, 1.5)])
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "test.wav")
+        for sample_format, bits in [('int16', 16), ('int24', 24),
+                                    ('int32', 32), ('float32', 32)]:
+            sound_toy.wav_file.save([left, right], filename, 1000, blocksize = 64,
+                                    sample_format = sample_format)
+            nose.tools.assert_equals(os.path.getsize(filename) % 2, 0)
+
+            tracks = sound_toy.wav_file.open(filename)
+            nose.tools.assert_equals(len(tracks), 2)
+
+            expected_right = numpy.zeros(300)
+            expected_right[:200] = right.as_array(1000)
+            if sample_format != 'float32':
+                expected_right = numpy.clip(expected_right, -1, 1)
+
+            tolerance = 2 ** (1 - bits) if sample_format != 'float32' else 1e-7
+            numpy.testing.assert_allclose(tracks[0].as_array(1000), left.as_array(1000),
+                                          atol = tolerance)
+            numpy.testing.assert_allclose(tracks[1].as_array(1000), expected_right,
+                                          atol = tolerance)
@@ -79,6 +79,12 @@ class Tone:
     def __float__(self):
         return self.freq
 
+    def __eq__(self, other):
+        return isinstance(other, Tone) and self.n == other.n
+
+    def __hash__(self):
+        return hash((Tone, self.n))
+
 # ********************************** Scales ************************************
 
 
@@ -3,37 +3,185 @@ import math
 import itertools
 import numpy
 
+DEFAULT_BLOCKSIZE = 4096
+DEFAULT_DTYPE = numpy.float64
+
+class Renderer(object):
+    """
+    Renderer holds the state of a single rendering of a track.
+    It is created by BaseTrack.renderer() and produces consecutive
+    blocks of the track's samples.
+    A renderer must only be used by one thread at a time, but any number
+    of renderers of the same track may run concurrently.
+    """
+    def __init__(self, samplerate, open_input = None):
+        """
+        Parameters:
+            samplerate: Samplerate of the generated values.
+            open_input: Function taking an input track and the dtype in which
+                it will be read (None if it doesn't matter) and returning its
+                renderer, None to use the track's own renderer.
+        """
+        self.samplerate = samplerate
+        self._open_input = open_input
+
+    def _open(self, track, dtype = None):
+        """
+        Return renderer for an input track of this renderer.
+
+        Parameters:
+            dtype: Dtype in which the input will be read, None for the
+                dtype of the output.
+        """
+        if self._open_input is None:
+            return track.renderer(self.samplerate)
+        else:
+            return self._open_input(track, dtype)
+
+    def render(self, out):
+        """
+        Write next len(out) samples of the track into out.
+        Returns number of samples written. If this is less than len(out),
+        the track has ended and the rest of out is left untouched.
+
+        Parameters:
+            out: Float numpy array to fill. Renderers keep their working
+                buffers in the dtype of out, so passing float32 arrays runs
+                the whole graph in single precision.
+        """
+        raise NotImplementedError()
+
+    def render_block(self, size, dtype = DEFAULT_DTYPE):
+        """
+        Return a new array with (at most) size next samples of the track.
+        """
+        out = numpy.empty(size, dtype)
+        return out[:self.render(out)]
+
+    def skip(self, count):
+        """
+        Advance the renderer by count samples without producing them.
+        Returns number of samples skipped. If this is less than count,
+        the track has ended (renderers that can't tell early may return
+        count and end on the following render).
+        The default implementation renders the samples and throws them away.
+        """
+        block = numpy.empty(min(count, DEFAULT_BLOCKSIZE))
+        skipped = 0
+        while skipped < count:
+            chunk = block[:count - skipped]
+            rendered = self.render(chunk)
+            skipped += rendered
+            if rendered < len(chunk):
+                break
+        return skipped
+
+
+class _IterRenderer(Renderer):
+    """
+    Renderer for tracks that only implement as_iter.
+    """
+    def __init__(self, it, samplerate):
+        super(_IterRenderer, self).__init__(samplerate)
+        self._it = it
+
+    def render(self, out):
+        arr = numpy.fromiter(itertools.islice(self._it, len(out)), out.dtype)
+        out[:len(arr)] = arr
+        return len(arr)
+
+
 class BaseTrack(object):
     """
     A track represents any that can be sampled -- sound, frequency, volume, ...
+
+    Subclasses implement either _renderer (block based, preferred) or
+    as_iter (sample by sample).
+
+    Tracks are immutable once constructed, everything that changes during
+    rendering belongs to the renderer. The same track can therefore be
+    shared between mixer voices, memoized and rendered from several
+    threads at once.
     """
+
+    # True if _renderer takes open_input argument and the renderer
+    # consumes its inputs block by block, in lockstep with its output.
+    # Such tracks can be flattened by the compiler.
+    _dataflow = False
+
     def __init__(self, *slaves):
-        self._slaves = list(slaves) # TODO: This is not necessary
+        self._slaves = tuple(slaves)
 
         self.name = self.__class__.__name__
 
+    def renderer(self, samplerate, start = 0):
+        """
+        Return a new renderer that generates this track's data block by block.
+
+        Parameters:
+            samplerate: Samplerate for whitch to generate the values.
+            start: Index of the first sample to generate.
+        """
+        renderer = self._renderer(samplerate)
+        if start:
+            renderer.skip(start)
+        return renderer
+
+    def _renderer(self, samplerate):
+        """
+        Create a renderer for this track.
+        The default implementation wraps as_iter.
+        """
+        if type(self).as_iter is BaseTrack.as_iter:
+            raise NotImplementedError()
+        return _IterRenderer(self.as_iter(samplerate), samplerate)
+
     def as_iter(self, samplerate):
         """
         Return interator with individual track values.
+        This is only a compatibility adapter over renderer().
 
         Parameters:
             samplerate: Samplerate for whitch to generate the values.
         """
-        raise NotImplemented()
+        renderer = self.renderer(samplerate)
+        block = numpy.empty(DEFAULT_BLOCKSIZE)
 
-    def as_array(self, samplerate):
+        while True:
+            count = renderer.render(block)
+            yield from block[:count].tolist()
+            if count < len(block):
+                return
+
+    def as_array(self, samplerate, start = 0, end = None, dtype = DEFAULT_DTYPE):
         """
         Return numpy array of this track's data
-        For infinite tracks this just hangs!
+        For infinite tracks this just hangs (unless end is given)!
         This is only for reading and for most tracks it's
-        generated from the iterator.
+        generated from the renderer.
 
         Parameters:
             samplerate: Samplerate for whitch to generate the values.
+            start: Index of the first sample returned.
+            end: Index after the last sample returned, None for the
+                end of the track.
+            dtype: Float dtype to render in.
         """
-        return numpy.fromiter(self.as_iter(samplerate), numpy.float)
+        renderer = self.renderer(samplerate, start)
+        if end is not None:
+            return renderer.render_block(max(end - start, 0), dtype)
+
+        blocks = []
 
-    def as_arrays_iter(self, samplerate, size, zfill = True):
+        while True:
+            block = numpy.empty(DEFAULT_BLOCKSIZE, dtype)
+            count = renderer.render(block)
+            blocks.append(block[:count])
+            if count < len(block):
+                return numpy.concatenate(blocks)
+
+    def as_arrays_iter(self, samplerate, size, zfill = True, start = 0,
+                       dtype = DEFAULT_DTYPE):
         """
         Return iterator that gives numpy arrays of limited size containing
         the track's data.
@@ -43,19 +191,26 @@ class BaseTrack(object):
             size: Size of the arrays returned
             zfill: If True, the last array is zero padded,
                 otherwise it may be shorter.
+            start: Index of the first sample returned.
+            dtype: Float dtype to render in.
         """
-        it = self.as_iter(samplerate)
+        renderer = self.renderer(samplerate, start)
 
         while True:
-            arr = numpy.fromiter(itertools.islice(it, size), dtype=numpy.float)
+            arr = numpy.empty(size, dtype)
+            count = renderer.render(arr)
 
-            if not len(arr):
-                return
-            elif len(arr) < size and zfill:
-                yield numpy.append(arr, numpy.zeros(size - len(arr)))
-                return
-            else:
-                yield numpy.array(arr)
+            if count == size:
+                yield arr
+                continue
+
+            if count:
+                if zfill:
+                    arr[count:] = 0
+                    yield arr
+                else:
+                    yield arr[:count]
+            return
 
     def add_slave(self, track):
         """
@@ -63,7 +218,7 @@ class BaseTrack(object):
         If track is not a BaseTrack subclass, then this method does nothing.
         """
         if isinstance(track, BaseTrack):
-            self._slaves.append(track)
+            self._slaves += (track,)
 
     def len(self, samplerate):
         """
@@ -71,20 +226,211 @@ class BaseTrack(object):
         or infinity if the track is infinite.
         May sometime return a too high value (for mixers).
         """
-        raise NotImplemented()
+        raise NotImplementedError()
+
+    def _parts(self, samplerate, length):
+        """
+        Split the track to independent parts for parallel rendering.
+        Returns pair (parts, end), where parts is a list of (offset, track)
+        pairs that sum up to this track (in the order in which the track
+        itself sums them) and end is the minimal length of the result,
+        or None if the track can't be split.
+
+        Parameters:
+            length: Number of samples that will be rendered,
+                None for the whole track.
+        """
+        return None
+
+    def control_rate(self, period = 32):
+        """
+        Return this track evaluated at control rate -- only every period
+        samples and linearly interpolated in between.
+        Useful for slowly changing modulation tracks (envelopes, LFOs).
+        """
+        return ControlRate(self, period)
+
+
+class _ControlRateRenderer(Renderer):
+    def __init__(self, track, period, samplerate):
+        super(_ControlRateRenderer, self).__init__(samplerate)
+        self._period = period
+        self._input = track.renderer(samplerate / period)
+        self._values = numpy.empty(0) # Control values, first one belongs to sample 0
+        self._position = 0 # Output position relative to the first control value
+        self._ended = False
+        self._remaining = track.len(samplerate) # Output samples until the end
+
+    def skip(self, count):
+        period = self._period
+        self._position += count
+        drop = self._position // period
+        if drop > len(self._values) and not self._ended:
+            # The last two control values before the position are kept,
+            # the track may end right after them
+            missing = drop - len(self._values) - 1
+            if missing:
+                skipped = self._input.skip(missing - 1)
+                kept = self._input.render_block(2) if skipped == missing - 1 else numpy.empty(0)
+                first = drop - 2
+                self._ended = len(kept) < 2
+            else:
+                block = self._input.render_block(1)
+                kept = numpy.concatenate((self._values[-1:], block))
+                first = max(len(self._values) - 1, 0)
+                self._ended = not len(block)
+            self._values = kept
+            self._position -= first * period
+        else:
+            self._drop()
+
+        count = max(min(count, self._remaining), 0)
+        self._remaining -= count
+        return count
+
+    def _end_point(self):
+        """
+        Return position of the last sample of the track relative to the
+        first control value (in periods) and its value extrapolated from
+        the last two control values, or None if the last control value
+        is already there.
+        """
+        last = (self._position + self._remaining - 1) / self._period
+        values = self._values
+        if self._remaining == float('inf') or last <= len(values) - 1:
+            return None
+        slope = values[-1] - values[-2] if len(values) > 1 else 0
+        return last, values[-1] + slope * (last - len(values) + 1)
+
+    def render(self, out):
+        period = self._period
+
+        # Control values on both sides of the last sample are needed
+        needed = (self._position + len(out) - 1) // period + 2
+        if not self._ended and len(self._values) < needed:
+            block = self._input.render_block(needed - len(self._values))
+            if len(block) < needed - len(self._values):
+                self._ended = True
+            self._values = numpy.concatenate((self._values, block))
+
+        count = max(min(len(out), self._remaining), 0)
+        if not count:
+            return 0
+        if not len(self._values):
+            # Skipped past the last control value
+            out[:count] = 0
+            self._remaining -= count
+            return count
+
+        xp = numpy.arange(len(self._values))
+        fp = self._values
+        if self._ended:
+            # The final partial period continues the slope of the last
+            # control values
+            end = self._end_point()
+            if end is not None:
+                xp = numpy.append(xp, end[0])
+                fp = numpy.append(fp, end[1])
+
+        x = numpy.arange(self._position, self._position + count) / period
+        out[:count] = numpy.interp(x, xp, fp)
+
+        self._position += count
+        self._remaining -= count
+        self._drop()
+
+        return count
+
+    def _drop(self):
+        """
+        Drop control values before the position, except for the last two.
+        """
+        drop = min(self._position // self._period, max(len(self._values) - 2, 0))
+        self._values = self._values[drop:]
+        self._position -= drop * self._period
+
+
+class ControlRate(BaseTrack):
+    """
+    Evaluates the slave track at samplerate / period and linearly
+    interpolates the values up to the full samplerate.
+    """
+    def __init__(self, track, period = 32):
+        super(ControlRate, self).__init__(track)
+        self._period = period
+
+    def _renderer(self, samplerate):
+        return _ControlRateRenderer(self._slaves[0], self._period, samplerate)
+
+    def len(self, samplerate):
+        return self._slaves[0].len(samplerate)
+
+
+class _ChainRenderer(Renderer):
+    def __init__(self, tracks, samplerate):
+        super(_ChainRenderer, self).__init__(samplerate)
+        self._tracks = iter(tracks)
+        self._current = None
+
+    def render(self, out):
+        written = 0
+        while written < len(out):
+            if self._current is None:
+                try:
+                    self._current = next(self._tracks).renderer(self.samplerate)
+                except StopIteration:
+                    break
+
+            count = self._current.render(out[written:])
+            if written + count < len(out):
+                self._current = None
+            written += count
+
+        return written
+
+    def skip(self, count):
+        skipped = 0
+        while skipped < count:
+            if self._current is None:
+                try:
+                    self._current = next(self._tracks).renderer(self.samplerate)
+                except StopIteration:
+                    break
+
+            chunk = self._current.skip(count - skipped)
+            if skipped + chunk < count:
+                self._current = None
+            skipped += chunk
+
+        return skipped
 
 
 class Chain(BaseTrack):
-    def as_iter(self, samplerate):
-        for slave in self._slaves:
-            for x in slave.as_iter(samplerate, i):
-                yield x
-                i += 1
+    def _renderer(self, samplerate):
+        return _ChainRenderer(self._slaves, samplerate)
 
     def len(self, samplerate):
         return sum((x.len(samplerate) for x in self._slaves))
 
 
+class _NumpyRenderer(Renderer):
+    def __init__(self, data, samplerate):
+        super(_NumpyRenderer, self).__init__(samplerate)
+        self._data = data
+        self._position = 0
+
+    def render(self, out):
+        chunk = self._data[self._position:self._position + len(out)]
+        out[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def skip(self, count):
+        skipped = max(min(count, len(self._data) - self._position), 0)
+        self._position += skipped
+        return skipped
+
+
 class NumpyTrack(BaseTrack):
     """
     Track that wraps array of pre-sampled numpy data.
@@ -95,34 +441,28 @@ class NumpyTrack(BaseTrack):
         self._data = data
         self._samplerate = samplerate
 
+    @property
+    def samplerate(self):
+        return self._samplerate
+
     def _check_samplerate(self, samplerate):
         if self._samplerate != samplerate:
             raise Exception(
                 ("The track has samplerate fixed to {} Hz, requested {} Hz. " +
-                "Use resampler.").format(self._samplerate, samplerate))
-
-    def as_iter(self, samplerate):
-        self._check_samplerate(saplerate)
-        return iter(self._data)
-
-    def as_array(self, samplerate):
-        self._check_samplerate(saplerate)
-        return self._data
+                "Wrap it in resampler.Resampler.").format(self._samplerate, samplerate))
 
-    def as_arrays_iter(self, samplerate, size, zfill = True):
+    def _renderer(self, samplerate):
         self._check_samplerate(samplerate)
+        return _NumpyRenderer(self._data, samplerate)
 
-        for offset in itertools.count(0, size):
-            arr = self._data[offset:offset + size]
-
-            if not len(arr):
-                return
-            elif len(arr) < size and zfill:
-                yield numpy.append(arr, numpy.zeros(size - len(arr)))
-                return
-            else:
-                yield numpy.array(arr)
+    def as_array(self, samplerate, start = 0, end = None, dtype = DEFAULT_DTYPE):
+        self._check_samplerate(samplerate)
+        if start == 0 and end is None:
+            data = self._data
+        else:
+            data = self._data[start:end]
+        return data.astype(dtype, copy = False)
 
     def len(self, samplerate):
-        self._check_samplerate(saplerate)
+        self._check_samplerate(samplerate)
         return len(self._data)
@@ -1,5 +1,8 @@
 import itertools
 import functools
+import collections
+import threading
+import weakref
 
 def counted_iterator(count):
     """ Returns iterator that counts from 0 to count,
@@ -11,16 +14,107 @@ def counted_iterator(count):
         return iter(range(count))
 
 
+MemoizeInfo = collections.namedtuple(
+    'MemoizeInfo', ['hits', 'misses', 'evictions', 'uncacheable', 'size', 'maxsize'])
+
+
 class Memoize:
-    def __init__(self, f):
+    """
+    Remembers results of a function.
+    If maxsize is set, only that many results are kept, least recently used
+    ones are evicted first.
+    If weak is True, only weak references to the results are kept (results
+    that don't support weak references are kept normally).
+    Calls with unhashable arguments are passed through without caching.
+    """
+    def __init__(self, f, maxsize = None, weak = False):
         self._f = f
-        self._cache = {}
+        self._cache = collections.OrderedDict()
+        self._maxsize = maxsize
+        self._weak = weak
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+        functools.update_wrapper(self, f)
+
+    @staticmethod
+    def _key(args, kwargs):
+        return (tuple(args), tuple(sorted(kwargs.items())))
+
+    def _get(self, key):
+        """ Return cached value or raise KeyError. Must hold the lock. """
+        value = self._cache[key]
+        if self._weak and isinstance(value, weakref.ref):
+            value = value()
+            if value is None:
+                del self._cache[key]
+                raise KeyError(key)
+        self._cache.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        """ Store a value. Must hold the lock. """
+        if self._weak:
+            try:
+                value = weakref.ref(value)
+            except TypeError:
+                pass
+        self._cache[key] = value
+
+        while self._maxsize is not None and len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
 
     def __call__(self, *args, **kwargs):
-        key = (tuple(args), tuple(sorted(kwargs.items())))
-        if key not in self._cache:
-            self._cache[key] = self._f(*args, **kwargs)
-        return self._cache[key]
+        key = self._key(args, kwargs)
+        try:
+            hash(key)
+        except TypeError:
+            with self._lock:
+                self.uncacheable += 1
+            return self._f(*args, **kwargs)
+
+        with self._lock:
+            try:
+                value = self._get(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                return value
+
+        value = self._f(*args, **kwargs)
+
+        with self._lock:
+            self._put(key, value)
+        return value
+
+    def invalidate(self, *args, **kwargs):
+        """ Forget the result for the given arguments. """
+        with self._lock:
+            self._cache.pop(self._key(args, kwargs), None)
+
+    def clear(self):
+        """ Forget all results. """
+        with self._lock:
+            self._cache.clear()
+
+    def info(self):
+        """ Return MemoizeInfo with the cache statistics. """
+        with self._lock:
+            return MemoizeInfo(self.hits, self.misses, self.evictions,
+                               self.uncacheable, len(self._cache), self._maxsize)
 
     def __repr__(self):
        return self._f.__doc__
+
+
+def memoize(maxsize = None, weak = False):
+    """
+    Decorator version of Memoize with parameters.
+    """
+    return functools.partial(Memoize, maxsize = maxsize, weak = weak)
@@ -1,52 +1,308 @@
-import wave
+import struct
+import collections
+import builtins
+import os
+import queue
+import threading
 import numpy
 
-from .tracks import NumpyTrack
+from .tracks import BaseTrack, Renderer
 
-def save(track, filename, samplerate=44100, blocksize=4096):
+_WavInfo = collections.namedtuple(
+    '_WavInfo', ['format', 'channels', 'samplerate', 'bits', 'offset', 'frames'])
+
+_PCM = 1
+_IEEE_FLOAT = 3
+_EXTENSIBLE = 0xFFFE
+
+# (format, bits) -> dtype of a sample in the file, 24 bit samples are bytes
+_dtypes = {
+    (_PCM, 8): numpy.dtype('u1'),
+    (_PCM, 16): numpy.dtype('<i2'),
+    (_PCM, 24): numpy.dtype('u1'),
+    (_PCM, 32): numpy.dtype('<i4'),
+    (_IEEE_FLOAT, 32): numpy.dtype('<f4'),
+    (_IEEE_FLOAT, 64): numpy.dtype('<f8'),
+    }
+
+# Sample formats for saving
+_formats = {
+    'int16': (_PCM, 16),
+    'int24': (_PCM, 24),
+    'int32': (_PCM, 32),
+    'float32': (_IEEE_FLOAT, 32),
+    }
+
+def _header(format, channels, samplerate, bits, frames):
     """
-    Save a track to a file.
+    Return RIFF header of a wave file, up to the start of the sample data.
     """
+    block_align = channels * bits // 8
+    size = frames * block_align
+
+    fmt = struct.pack('<HHIIHH', format, channels, samplerate,
+                      samplerate * block_align, block_align, bits)
+    chunks = b''
+    if format == _IEEE_FLOAT:
+        fmt += struct.pack('<H', 0)
+        chunks += struct.pack('<4sII', b'fact', 4, frames)
+    chunks = struct.pack('<4sI', b'fmt ', len(fmt)) + fmt + chunks
+    chunks += struct.pack('<4sI', b'data', size)
+
+    riff_size = 4 + len(chunks) + size + size % 2
+    return struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE') + chunks
+
+class _Encoder:
+    """
+    Converts planar float blocks to interleaved samples in a reused
+    buffer and writes them to the file.
+    """
+    def __init__(self, f, format, bits, channels, blocksize):
+        self._f = f
+        self._format = format
+        self._bits = bits
+
+        if format == _IEEE_FLOAT:
+            self._out = numpy.empty((blocksize, channels), '<f4')
+        elif bits == 24:
+            # Converted through 32 bit integers, then the top bytes are dropped
+            self._out = numpy.empty((blocksize, channels), '<i4')
+            self._packed = numpy.empty((blocksize, channels, 3), 'u1')
+        else:
+            self._out = numpy.empty((blocksize, channels), '<i{}'.format(bits // 8))
+
+        self.frames = 0
+
+    def write(self, block, frames):
+        block = block[:, :frames]
+        out = self._out[:frames]
+
+        if self._format == _PCM:
+            numpy.clip(block, -1, 1, out=block)
+            block *= 2**(self._bits - 1) - 1
+        # Interleaves and converts in one pass
+        numpy.copyto(out.T, block, casting='unsafe')
 
-    w = wave.open(filename, 'w')
-    w.setparams((1, 2, samplerate, 0, 'NONE', 'not compressed'))
+        if self._bits == 24:
+            packed = self._packed[:frames]
+            numpy.copyto(packed, out.view('u1').reshape(frames, -1, 4)[:, :, :3])
+            out = packed
 
-    maximum = 2**15 - 1
-    dtype = numpy.dtype('<i2')
+        self._f.write(out.data)
+        self.frames += frames
 
+def save(tracks, filename, samplerate=44100, blocksize=4096, sample_format='int16'):
+    """
+    Save a track, or a list of tracks as channels, to a file.
+    Rendering runs in the calling thread, while a background thread
+    converts the blocks and writes them.
+
+    Parameters:
+        sample_format: 'int16', 'int24', 'int32' or 'float32'.
+    """
     try:
-        for values in track.as_arrays_iter(samplerate, blocksize, zfill = False):
-            numpy.clip(values, -1, 1, out=values)
-            values *= maximum
+        iter(tracks)
+    except TypeError:
+        tracks = [tracks]
+    tracks = list(tracks)
+    channels = len(tracks)
 
-            values = numpy.array(values, dtype)
+    format, bits = _formats[sample_format]
+    # Single precision can't hold 32 bit integers
+    dtype = numpy.float64 if bits == 32 and format == _PCM else numpy.float32
 
-            w.writeframes(values.tostring())
-    finally:
-        w.close()
+    free = queue.Queue()
+    for i in range(3):
+        free.put(numpy.empty((channels, blocksize), dtype))
+    full = queue.Queue()
+    errors = []
 
-def open(filename):
+    with builtins.open(filename, 'wb') as f:
+        f.write(_header(format, channels, samplerate, bits, 0))
+        encoder = _Encoder(f, format, bits, channels, blocksize)
+
+        def write():
+            while True:
+                item = full.get()
+                if item is None:
+                    return
+                block, frames = item
+                try:
+                    if not errors:
+                        encoder.write(block, frames)
+                except BaseException as e:
+                    errors.append(e)
+                free.put(block)
+
+        thread = threading.Thread(target=write, daemon=True)
+        thread.start()
+
+        try:
+            renderers = [track.renderer(samplerate) for track in tracks]
+            frames = blocksize
+            while frames == blocksize and not errors:
+                block = free.get()
+                counts = [renderer.render(row) for renderer, row in zip(renderers, block)]
+                frames = max(counts)
+                for row, count in zip(block, counts):
+                    row[count:frames] = 0 # Channels that have ended
+                full.put((block, frames))
+        finally:
+            full.put(None)
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        size = encoder.frames * channels * bits // 8
+        if size % 2:
+            f.write(b'\0')
+        f.seek(0)
+        f.write(_header(format, channels, samplerate, bits, encoder.frames))
+
+def _read_info(filename):
     """
-    Open a wave file and return a list of tracks corresponding
-    to channels in the file.
+    Parse RIFF chunks of a wave file up to the start of the sample data.
     """
+    with builtins.open(filename, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:] != b'WAVE':
+            raise Exception("{} is not a wave file".format(filename))
 
-    w = wave.open(filename, 'r')
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise Exception("{} has no data chunk".format(filename))
+            chunk_id, size = struct.unpack('<4sI', header)
 
-    try:
-        data = numpy.fromstring(
-            w.readframes(w.getnframes()),
-            "<i" + str(w.getsampwidth()))
+            if chunk_id == b'data':
+                break
+            elif chunk_id == b'fmt ':
+                fmt = f.read(size)
+                f.seek(size % 2, 1)
+            else:
+                f.seek(size + size % 2, 1)
 
-        data_float = numpy.array(data, dtype='float');
-        data_float /= 2**(8 * w.getsampwidth() - 1) - 1
+        if fmt is None:
+            raise Exception("{} has no format chunk".format(filename))
 
-        ret = []
-        for i in range(w.getnchannels()):
-            ret.append(
-                NumpyTrack(data_float[i::w.getnchannels()], w.getframerate()))
+        offset = f.tell()
+        # Size of the data chunk is not reliable in streamed files
+        size = min(size, os.fstat(f.fileno()).st_size - offset)
 
-        return ret
+    format, channels, samplerate, _, block_align, bits = \
+        struct.unpack('<HHIIHH', fmt[:16])
+    if format == _EXTENSIBLE:
+        format, = struct.unpack('<H', fmt[24:26])
 
-    finally:
-        w.close()
+    if (format, bits) not in _dtypes:
+        raise Exception("Unsupported wave format {} with {} bit samples".format(
+            format, bits))
+
+    return _WavInfo(format, channels, samplerate, bits, offset, size // block_align)
+
+
+class _WavFileRenderer(Renderer):
+    def __init__(self, track, samplerate):
+        super(_WavFileRenderer, self).__init__(samplerate)
+        self._samples = track.raw()
+        self._decode = track._decode
+        self._position = 0
+
+    def render(self, out):
+        chunk = self._samples[self._position:self._position + len(out)]
+        self._decode(chunk, out[:len(chunk)])
+        self._position += len(chunk)
+        return len(chunk)
+
+    def skip(self, count):
+        skipped = max(min(count, len(self._samples) - self._position), 0)
+        self._position += skipped
+        return skipped
+
+
+class WavFileTrack(BaseTrack):
+    """
+    Track that plays one channel of a wave file.
+    The file is memory mapped and only the blocks being rendered are
+    decoded, so opening even large files costs almost no memory.
+    Supports 8, 16, 24 and 32 bit integer and 32 and 64 bit float samples.
+    """
+
+    def __init__(self, filename, channel = 0):
+        super(WavFileTrack, self).__init__()
+        self._filename = filename
+        self._channel = channel
+        self._info = _read_info(filename)
+
+        if not 0 <= channel < self._info.channels:
+            raise Exception("File {} has only {} channels".format(
+                filename, self._info.channels))
+
+    @property
+    def samplerate(self):
+        return self._info.samplerate
+
+    def raw(self):
+        """
+        Return read only strided view of this channel's samples in the file.
+        24 bit samples are rows of three bytes.
+        """
+        info = self._info
+        dtype = _dtypes[info.format, info.bits]
+        if info.bits == 24:
+            shape = (info.frames, info.channels, 3)
+        else:
+            shape = (info.frames, info.channels)
+
+        if info.frames:
+            frames = numpy.memmap(self._filename, dtype, 'r', info.offset, shape)
+        else:
+            frames = numpy.empty(shape, dtype) # Empty files can't be mapped
+        return frames[:, self._channel]
+
+    def _decode(self, samples, out):
+        """
+        Convert raw samples to floats in out.
+        """
+        info = self._info
+        if info.format == _IEEE_FLOAT:
+            out[:] = samples
+            return
+        elif info.bits == 8:
+            numpy.subtract(samples, 128.0, out=out)
+        elif info.bits == 24:
+            values = samples[:, 2].astype(numpy.int8).astype(numpy.int32)
+            values <<= 8
+            values |= samples[:, 1]
+            values <<= 8
+            values |= samples[:, 0]
+            out[:] = values
+        else:
+            out[:] = samples
+
+        out *= 1 / (2**(info.bits - 1) - 1)
+
+    def _check_samplerate(self, samplerate):
+        if self._info.samplerate != samplerate:
+            raise Exception(
+                ("The track has samplerate fixed to {} Hz, requested {} Hz. " +
+                "Wrap it in resampler.Resampler.").format(self._info.samplerate, samplerate))
+
+    def _renderer(self, samplerate):
+        self._check_samplerate(samplerate)
+        return _WavFileRenderer(self, samplerate)
+
+    def len(self, samplerate):
+        self._check_samplerate(samplerate)
+        return self._info.frames
+
+
+def open(filename):
+    """
+    Open a wave file and return a list of tracks corresponding
+    to channels in the file (see WavFileTrack).
+    """
+    channels = _read_info(filename).channels
+    return [WavFileTrack(filename, i) for i in range(channels)]
@@ -1,7 +1,19 @@
 import matplotlib.pyplot as plt
 import numpy
 
-def plot(tracks, samplerate = 10000):
+from . import peaks
+
+def plot(tracks, samplerate = 10000, start = 0, end = None, width = 2000):
+    """
+    Plot waveforms of tracks.
+    Long tracks are drawn as min/max envelopes from a peak summary with
+    about width bins, so memory use doesn't grow with the track length.
+
+    Parameters:
+        start: Start of the plotted window in seconds.
+        end: End of the plotted window in seconds, required for infinite tracks.
+        width: Number of bins to draw, roughly the plot width in pixels.
+    """
     try:
         iter(tracks)
     except TypeError:
@@ -13,8 +25,16 @@ def plot(tracks, samplerate = 10000):
         plot.set_title(track.name)
         plot.set_xlabel("time [s]")
 
-        ys = track.as_array(samplerate)
-        xs = numpy.arange(len(ys)) / samplerate
-        plot.plot(xs, ys)
+        pyramid = peaks.summarize(track, samplerate, start, end)
+        if pyramid.length <= width:
+            first = pyramid.start
+            ys = track.as_array(samplerate, first, first + pyramid.length)
+            xs = (first + numpy.arange(len(ys))) / samplerate
+            plot.plot(xs, ys)
+        else:
+            level = pyramid.level(width)
+            xs = pyramid.times(level)
+            plot.fill_between(xs, level.min, level.max, linewidth = 0)
+            plot.fill_between(xs, -level.rms, level.rms, linewidth = 0)
 
     plt.show()